@@ -1,52 +1,73 @@
 from bson import ObjectId
-from flask import Flask, Blueprint, request, jsonify
+from bson.errors import InvalidId
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
-import pandas as pd
-from werkzeug.security import generate_password_hash, check_password_hash
+import pymongo
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from werkzeug.http import generate_etag, is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.wsgi import wrap_file
 import jwt
 import datetime
 import os
 from functools import wraps
-from google.cloud import storage
 import uuid
-import certifi
-import requests
-import google.generativeai as genai
+import io
+import json
+import threading
+from itertools import islice
+
+import metrics
+from cache import ByteLRUCache, TTLCache
+from counters import ATTENDANCE_STATS_COLLECTION, record_attendance, summarise
+from db_indexes import ensure_indexes
+from descriptions import DescriptionService, create_description_client
+from feed import CHECKIN_FEED_SOURCE, ChangeStreamPublisher, CheckinBroker, stream_events
+from forecasts import PredictionService, next_hour
+from image_storage import LocalImageStorage, get_image_storage
+from passwords import HashingBusy, hash_password, needs_rehash, verify_password
+from rate_limit import RateLimiter
+from rollups import archived_checkins, merge_checkins
+from thumbnails import THUMBNAIL_SIZES, derivative_name, schedule_derivatives
+import services
+from services import LazyCollection, get_db, get_weather_provider
 
-import predictor
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret_key') # Change this in production!
-CORS(app)
 api = Blueprint("api", __name__)
+metrics.install(api)
+# Liveness, readiness and metrics; served at the root rather than under /api/v1
+ops = Blueprint("ops", __name__)
+
+users_collection = LazyCollection("users")
+modules_collection = LazyCollection("modules")
+module_participants_collection = LazyCollection("module_participants")
+lecture_attendances_collection = LazyCollection("lecture_attendances")
+attendance_stats_collection = LazyCollection(ATTENDANCE_STATS_COLLECTION)
+images_collection = LazyCollection("images")
+
+description_service = DescriptionService(create_description_client())
+
+ACCESS_TOKEN_TTL = datetime.timedelta(minutes=int(os.environ.get("ACCESS_TOKEN_TTL_MINUTES", 30)))
+REFRESH_TOKEN_TTL = datetime.timedelta(days=int(os.environ.get("REFRESH_TOKEN_TTL_DAYS", 30)))
+PRINCIPAL_CACHE_TTL_SECONDS = 60
+# Everything handlers read from current_user; never the password hash
+PRINCIPAL_PROJECTION = {"username": 1, "email": 1}
+
+# Users keyed by id string, so most authenticated calls skip the Mongo round trip
+principal_cache = TTLCache(maxsize=10_000, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def load_principal(user_id: str):
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        principal = users_collection.find_one({"_id": ObjectId(user_id)}, PRINCIPAL_PROJECTION)
+        if principal is not None:
+            principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id: str):
+    principal_cache.pop(user_id)
 
-client = MongoClient(os.environ["MONGODB_URI"], tls=True, tlsCAFile=certifi.where())
-db = client["CoreSystem"]
-users_collection = db["users"]
-modules_collection = db["modules"]
-module_participants_collection = db["module_participants"]
-lecture_attendances_collection = db["lecture_attendances"]
-
-GCP_IMAGES_BUCKET_NAME = "bepresentimages"
-GCP_CREDENTIALS_FILE_PATH = "gcp-credentials.json"
-
-weather_forecast = requests.get("https://api.open-meteo.com/v1/forecast", {
-    "latitude": 53.8008,
-    "longitude": -0.15491,
-    "hourly": ",".join([
-        "temperature_2m",
-        "precipitation",
-        "cloud_cover"
-    ])
-}).json()
-hourly = weather_forecast["hourly"]
-weather_df = pd.DataFrame({
-    "datetime": pd.to_datetime(hourly["time"]),  # Open-Meteo returns ISO strings
-    "temperature": hourly["temperature_2m"],
-    "precipitation": hourly["precipitation"],
-    "cloud_cover": hourly["cloud_cover"],
-}).set_index("datetime").sort_index()
 
 def token_required(f):
     @wraps(f)
@@ -55,27 +76,70 @@ def token_required(f):
         auth_header = request.headers.get("Authorization", "")
         if auth_header.startswith("Bearer "):
             token = auth_header.removeprefix("Bearer ").strip()
+        elif request.accept_mimetypes.best == "text/event-stream":
+            # EventSource can't set headers, so live feeds may pass the token in the query string
+            token = request.args.get("access_token")
         
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = users_collection.find_one({"username": data['username']})
+            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+            if data.get("type", "access") != "access":
+                return jsonify({'message': 'Token is invalid!'}), 401
+            if "sub" in data:
+                current_user = load_principal(data["sub"])
+            else:
+                # Tokens issued before the user id was embedded only carry the username
+                current_user = users_collection.find_one({"username": data['username']}, PRINCIPAL_PROJECTION)
             if not current_user:
                 return jsonify({'message': 'Token is invalid!'}), 404
-        except:
+        except (jwt.InvalidTokenError, InvalidId, KeyError):
             return jsonify({'message': 'Token is invalid!'}), 401
         
         return f(current_user, *args, **kwargs)
     
     return decorated
 
-def generate_token(username: str):
+def generate_token(user_id: str, username: str):
     return jwt.encode({
+        'sub': user_id,
         'username': username,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=30)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+        'type': 'access',
+        'exp': datetime.datetime.utcnow() + ACCESS_TOKEN_TTL
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
+
+def generate_refresh_token(user_id: str):
+    return jwt.encode({
+        'sub': user_id,
+        'type': 'refresh',
+        'exp': datetime.datetime.utcnow() + REFRESH_TOKEN_TTL
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
+
+def token_response(user_id, username: str):
+    return jsonify({
+        'token': generate_token(str(user_id), username),
+        'refresh_token': generate_refresh_token(str(user_id))
+    })
+
+# Per account, the primary guard against guessing
+LOGIN_ATTEMPTS_PER_IDENTIFIER = int(os.environ.get("LOGIN_ATTEMPTS_PER_IDENTIFIER", 10))
+LOGIN_ATTEMPTS_PER_IDENTIFIER_WINDOW_SECONDS = 5 * 60
+# Per client IP, only a flood guard: a lecture hall on campus NAT/eduroam shares one address
+LOGIN_ATTEMPTS_PER_IP = int(os.environ.get("LOGIN_ATTEMPTS_PER_IP", 300))
+LOGIN_ATTEMPTS_PER_IP_WINDOW_SECONDS = 60
+# Reverse proxies/load balancers in front of the app whose X-Forwarded-* headers are trusted. Opt-in: with the
+# default of 0 a client-supplied X-Forwarded-For is ignored, so it can't dodge the per-IP login limit
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+
+login_ip_limiter = RateLimiter(LOGIN_ATTEMPTS_PER_IP, LOGIN_ATTEMPTS_PER_IP_WINDOW_SECONDS)
+login_identifier_limiter = RateLimiter(LOGIN_ATTEMPTS_PER_IDENTIFIER, LOGIN_ATTEMPTS_PER_IDENTIFIER_WINDOW_SECONDS)
+
+
+def busy_response():
+    response = jsonify({"message": "Server busy, try again shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
 
 @api.post("/users/register")
 def register():
@@ -87,21 +151,20 @@ def register():
     if not username or not email or not password:
         return {"message": "Missing required parameters"}, 400
 
-    existing = users_collection.find_one(
-        {"$or": [{"username": username}, {"email": email}]},
-        {"_id": 1, "username": 1, "email": 1},
-    )
+    try:
+        password_hash = hash_password(password)
+    except HashingBusy:
+        return busy_response()
 
-    if existing:
+    # The unique username/email indexes make this atomic; until they're confirmed built, pre-check as well
+    if not _unique_indexes_ready.is_set() and users_collection.find_one({"$or": [{"username": username}, {"email": email}]}, {"_id": 1}):
+        return jsonify({"message": "User already exists"}), 409
+    try:
+        result = users_collection.insert_one({"username": username, "email": email, "password_hash": password_hash})
+    except DuplicateKeyError:
         return jsonify({"message": "User already exists"}), 409
 
-    password_hash = generate_password_hash(password)
-
-    result = users_collection.insert_one({"username": username, "email": email, "password_hash": password_hash})
-
-    token = generate_token(username)
-
-    return jsonify({'token': token})
+    return token_response(result.inserted_id, username)
 
 @api.post("/users/login")
 def login():
@@ -112,29 +175,110 @@ def login():
     if not identifier or not password:
         return jsonify({"message": "Missing required parameters"}), 400
 
+    # Each verify costs a full hash, so cap attempts before doing any work
+    identifier_key = identifier.lower()
+    for limiter, key in ((login_identifier_limiter, identifier_key), (login_ip_limiter, request.remote_addr)):
+        allowed, retry_after = limiter.hit(key)
+        if not allowed:
+            response = jsonify({"message": "Too many login attempts, try again later"})
+            response.headers["Retry-After"] = str(retry_after)
+            return response, 429
+
     user = users_collection.find_one(
         {"$or": [{"email": identifier.lower()}, {"username": identifier}]},
         {"username": 1, "email": 1, "password_hash": 1},
     )
 
-    if not user or not check_password_hash(user["password_hash"], password):
-        return jsonify({"message": "Invalid credentials"}), 401
-    
-    token = generate_token(user["username"])
+    try:
+        if not user or not verify_password(user["password_hash"], password):
+            return jsonify({"message": "Invalid credentials"}), 401
+    except HashingBusy:
+        return busy_response()
+
+    login_identifier_limiter.reset(identifier_key)
+
+    # Upgrade hashes made under an older policy while we have the plaintext; retried next login if busy
+    if needs_rehash(user["password_hash"]):
+        try:
+            users_collection.update_one({"_id": user["_id"]}, {"$set": {"password_hash": hash_password(password)}})
+        except HashingBusy:
+            pass
+
+    return token_response(user["_id"], user["username"])
+
+@api.post("/users/refresh")
+def refresh_token():
+    data = request.get_json(silent=True) or {}
+    token = data.get("refresh_token") or ""
+
+    if not token:
+        return jsonify({"message": "Missing required parameters"}), 400
+
+    try:
+        claims = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+        if claims.get("type") != "refresh":
+            return jsonify({'message': 'Token is invalid!'}), 401
+        # Check the account still exists rather than trusting the cache for the long-lived token
+        invalidate_principal(claims["sub"])
+        user = load_principal(claims["sub"])
+    except (jwt.InvalidTokenError, InvalidId, KeyError):
+        return jsonify({'message': 'Token is invalid!'}), 401
 
-    return jsonify({'token': token})
+    if not user:
+        return jsonify({'message': 'Token is invalid!'}), 401
+
+    return token_response(user["_id"], user["username"])
 
 @api.get("/count_attendance")
 @token_required
 def count_attendance(current_user):
-    query = {"user_id": current_user["_id"]}
+    stats = attendance_stats_collection.find_one({"_id": str(current_user["_id"])})
+    summary = summarise(stats, datetime.datetime.utcnow().date())
 
-    attendance_count = lecture_attendances_collection.count_documents(query)
     return jsonify({
         'username': current_user["username"],
-        'attendance_count': attendance_count
+        'attendance_count': summary["total"],
+        'today': summary["today"],
+        'this_week': summary["this_week"],
+        'current_streak': summary["current_streak"],
+        'modules': summary["modules"]
     })
 
+def checkin_event(doc, username):
+    """A check-in as shown in the classmates list and pushed over the live feed."""
+    return {
+        "event_id": str(doc["_id"]),
+        "id": doc["user_id"],
+        "name": username,
+        "image_id": doc.get("image_id"),
+        "time": doc["date"].strftime("%I:%M %p")
+    }
+
+
+def checkin_events(docs):
+    # user_id is stored as a string, users are keyed by ObjectId, so fetch them all in one go
+    friend_ids = [ObjectId(doc["user_id"]) for doc in docs if ObjectId.is_valid(doc["user_id"])]
+    friends = {
+        str(friend["_id"]): friend
+        for friend in users_collection.find({"_id": {"$in": friend_ids}}, {"username": 1})
+    }
+
+    events = []
+    for doc in docs:
+        friend_user = friends.get(doc["user_id"])
+        if friend_user:
+            events.append(checkin_event(doc, friend_user.get("username", "Unknown")))
+    return events
+
+
+def checkin_event_from_change(doc):
+    principal = load_principal(doc["user_id"]) if ObjectId.is_valid(doc["user_id"]) else None
+    return checkin_event(doc, principal["username"]) if principal else None
+
+
+checkin_broker = CheckinBroker()
+
+
 @api.post("/log_attendance")
 @token_required
 def log_attendance(current_user):
@@ -156,16 +300,9 @@ def log_attendance(current_user):
     if not participant:
         return jsonify({"message": "User not enrolled in this module"}), 404
 
-    try:
-        storage_client = storage.Client.from_service_account_json(GCP_CREDENTIALS_FILE_PATH)
-        bucket = storage_client.bucket(GCP_IMAGES_BUCKET_NAME)
-        blob = bucket.blob(image_id)
-
-        if not blob.exists():
-            return jsonify({"message": "Image not found"}), 404
-    except Exception as e:
-        print(f"Error fetching image from GCP: {e}")
-        return jsonify({"message": "Error fetching image"}), 500
+    # Uploads are verified once when they complete, so the recorded metadata is enough here
+    if not images_collection.find_one({"_id": image_id, "user_id": user_id, "status": "ready"}, {"_id": 1}):
+        return jsonify({"message": "Image not found"}), 404
 
     today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = today_start + datetime.timedelta(days=1)
@@ -178,12 +315,18 @@ def log_attendance(current_user):
     if already_logged:
         return jsonify({"message": "Already logged attendance for this module today"}), 409
 
-    lecture_attendances_collection.insert_one({
+    logged_at = datetime.datetime.utcnow()
+    attendance = {
         "user_id": user_id,
         "module_id": module_id,
-        "date": datetime.datetime.utcnow(),
+        "date": logged_at,
         "image_id": image_id
-    })
+    }
+    lecture_attendances_collection.insert_one(attendance)
+    record_attendance(get_db(), user_id, module_id, logged_at)
+    invalidate_leaderboard(module_id)
+    if CHECKIN_FEED_SOURCE == "local":
+        checkin_broker.publish(module_id, checkin_event(attendance, current_user["username"]))
 
     # Get other classmates who checked in today
     classmates_cursor = lecture_attendances_collection.find({
@@ -192,24 +335,7 @@ def log_attendance(current_user):
         "user_id": {"$ne": user_id}  # Exclude self
     }).sort("date", -1).limit(10)
 
-    classmates = []
-    for doc in classmates_cursor:
-        friend_user = users_collection.find_one({"_id": doc["user_id"]}) # user_id is stored as ObjectId if inserted correctly, but earlier we cast to str. Let's check.
-        # Wait, in the insert above: "user_id": user_id (which is str(current_user["_id"])). So it's a string.
-        # But users_collection uses ObjectId for _id. So we need to query with ObjectId(doc["user_id"]) OR if we stored string, we query string.
-        # The code above says: user_id = str(current_user["_id"]). So we stored a string.
-        # But to find the user details, we need to query users_collection. users_collection keys are ObjectIds.
-        # So we need to convert string back to ObjectId.
-        from bson.objectid import ObjectId
-        friend_user = users_collection.find_one({"_id": ObjectId(doc["user_id"])})
-
-        if friend_user:
-            classmates.append({
-                "id": str(friend_user["_id"]),
-                "name": friend_user.get("username", "Unknown"),
-                "image_id": doc.get("image_id"),
-                "time": doc["date"].strftime("%I:%M %p")
-            })
+    classmates = checkin_events(list(classmates_cursor))
 
     return jsonify({
         "message": "Attendance logged successfully",
@@ -217,53 +343,465 @@ def log_attendance(current_user):
     }), 201
 
 
+@api.get("/modules/<module_code>/checkins/stream")
+@token_required
+def stream_checkins(current_user, module_code):
+    module = modules_collection.find_one({"code": module_code}, {"_id": 1})
+    if not module:
+        return jsonify({"message": "Module not found"}), 404
+    module_id = str(module["_id"])
+
+    participant = module_participants_collection.find_one({"user_id": str(current_user["_id"]), "module_id": module_id}, {"_id": 1})
+    if not participant:
+        return jsonify({"message": "User not enrolled in this module"}), 404
+
+    # Replay today's latest check-ins so a (re)connecting client starts from a complete list
+    today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    recent = list(lecture_attendances_collection.find({
+        "module_id": module_id,
+        "date": {"$gte": today_start}
+    }).sort("date", -1).limit(10))
+    initial = checkin_events(recent[::-1])
+
+    return Response(
+        stream_with_context(stream_events(checkin_broker, module_id, initial)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+ATTENDANCE_BATCH_MAX_ITEMS = 50
+# How far back a queued offline check-in may be dated
+ATTENDANCE_MAX_OFFLINE_AGE = datetime.timedelta(hours=24)
+
+
+@api.post("/log_attendance/batch")
+@token_required
+def log_attendance_batch(current_user):
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"message": "Missing required parameters"}), 400
+    if len(items) > ATTENDANCE_BATCH_MAX_ITEMS:
+        return jsonify({"message": f"At most {ATTENDANCE_BATCH_MAX_ITEMS} items per batch"}), 400
+
+    user_id = str(current_user["_id"])
+    now = datetime.datetime.utcnow()
+    results = [None] * len(items)
+    pending = []  # (index, key, module_code, image_id, logged_at) still to be validated
+
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        key = item.get("idempotency_key")
+        module_code = item.get("module_code")
+        image_id = item.get("image_id")
+        if not key or not module_code or not image_id:
+            results[index] = {"idempotency_key": key, "status": 400, "message": "Missing required parameters"}
+            continue
+        if not all(isinstance(value, str) for value in (key, module_code, image_id)):
+            results[index] = {"idempotency_key": key, "status": 400, "message": "idempotency_key, module_code and image_id must be strings"}
+            continue
+        try:
+            logged_at = _parse_utc_datetime(item.get("logged_at")) or now
+        except (TypeError, ValueError):
+            results[index] = {"idempotency_key": key, "status": 400, "message": "logged_at must be an ISO-8601 datetime"}
+            continue
+        if logged_at > now or now - logged_at > ATTENDANCE_MAX_OFFLINE_AGE:
+            results[index] = {"idempotency_key": key, "status": 400, "message": "logged_at is out of range"}
+            continue
+        pending.append((index, key, module_code, image_id, logged_at))
+
+    # Retried keys report what happened the first time, without redoing any checks
+    already_synced = {
+        doc["idempotency_key"]
+        for doc in lecture_attendances_collection.find(
+            {"user_id": user_id, "idempotency_key": {"$in": [key for _, key, *_ in pending]}},
+            {"idempotency_key": 1},
+        )
+    }
+
+    modules = {
+        module["code"]: str(module["_id"])
+        for module in modules_collection.find({"code": {"$in": list({code for _, _, code, _, _ in pending})}}, {"code": 1})
+    }
+    enrolled = {
+        participant["module_id"]
+        for participant in module_participants_collection.find(
+            {"user_id": user_id, "module_id": {"$in": list(modules.values())}}, {"module_id": 1}
+        )
+    }
+    existing_images = {
+        image["_id"]
+        for image in images_collection.find(
+            {"_id": {"$in": list({image_id for *_, image_id, _ in pending})}, "user_id": user_id, "status": "ready"}, {"_id": 1}
+        )
+    }
+
+    # One query covers the duplicate check for every module and day in the batch
+    days = [logged_at.replace(hour=0, minute=0, second=0, microsecond=0) for *_, logged_at in pending]
+    logged_days = set()
+    if days:
+        for doc in lecture_attendances_collection.find({
+            "user_id": user_id,
+            "module_id": {"$in": list(enrolled)},
+            "date": {"$gte": min(days), "$lt": max(days) + datetime.timedelta(days=1)}
+        }, {"module_id": 1, "date": 1}):
+            logged_days.add((doc["module_id"], doc["date"].date()))
+
+    to_insert = []
+    for index, key, module_code, image_id, logged_at in pending:
+        module_id = modules.get(module_code)
+        if key in already_synced:
+            results[index] = {"idempotency_key": key, "status": 200, "message": "Already synced"}
+        elif module_id is None:
+            results[index] = {"idempotency_key": key, "status": 404, "message": "Module not found"}
+        elif module_id not in enrolled:
+            results[index] = {"idempotency_key": key, "status": 404, "message": "User not enrolled in this module"}
+        elif image_id not in existing_images:
+            results[index] = {"idempotency_key": key, "status": 404, "message": "Image not found"}
+        elif (module_id, logged_at.date()) in logged_days:
+            results[index] = {"idempotency_key": key, "status": 409, "message": "Already logged attendance for this module today"}
+        else:
+            # Also catches two items for the same module and day within this batch
+            logged_days.add((module_id, logged_at.date()))
+            already_synced.add(key)
+            to_insert.append((index, {
+                "user_id": user_id,
+                "module_id": module_id,
+                "date": logged_at,
+                "image_id": image_id,
+                "idempotency_key": key
+            }))
+
+    inserted = set(range(len(to_insert)))
+    if to_insert:
+        try:
+            lecture_attendances_collection.insert_many([doc for _, doc in to_insert], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                inserted.discard(error["index"])
+                index, doc = to_insert[error["index"]]
+                if error.get("code") == 11000 and "user_idempotency_key_unique" in error.get("errmsg", ""):
+                    # A concurrent retry won the race on the unique idempotency index
+                    results[index] = {"idempotency_key": doc["idempotency_key"], "status": 200, "message": "Already synced"}
+                else:
+                    metrics.log_error("attendance_batch_write_failed", error.get("errmsg"), code=error.get("code"))
+                    results[index] = {"idempotency_key": doc["idempotency_key"], "status": 500, "message": "Error logging attendance"}
+
+    for position in sorted(inserted, key=lambda i: to_insert[i][1]["date"]):
+        index, doc = to_insert[position]
+        record_attendance(get_db(), user_id, doc["module_id"], doc["date"])
+        invalidate_leaderboard(doc["module_id"])
+        if CHECKIN_FEED_SOURCE == "local":
+            checkin_broker.publish(doc["module_id"], checkin_event(doc, current_user["username"]))
+        results[index] = {"idempotency_key": doc["idempotency_key"], "status": 201, "message": "Attendance logged successfully"}
+
+    return jsonify({"results": results})
+
+
+HISTORY_DEFAULT_LIMIT = 100
+HISTORY_MAX_LIMIT = 500
+HISTORY_DEFAULT_DAYS = 7
+
+
+def _history_cursor(doc):
+    return f"{doc['date'].isoformat()}|{doc['_id']}"
+
+
+def _parse_history_cursor(cursor):
+    """Split a next_cursor back into (date, ObjectId); ValueError if it wasn't one of ours."""
+    date, _, doc_id = cursor.partition("|")
+    if not ObjectId.is_valid(doc_id):
+        raise ValueError(cursor)
+    return datetime.datetime.fromisoformat(date), ObjectId(doc_id)
+
+
+def _history_modules(module_ids, catalog):
+    return [catalog["by_id"].get(module_id, {"id": module_id, "code": None, "name": ""}) for module_id in module_ids]
+
+
 @api.get("/attendance_history")
 @token_required
 def get_attendance_history(current_user):
     user_id = str(current_user["_id"])
+    group = request.args.get("group")
 
-    today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    seven_days_ago = today - datetime.timedelta(days=6)
+    try:
+        range_start = _parse_utc_datetime(request.args.get("from"))
+        range_end = _parse_utc_datetime(request.args.get("to"))
+        limit = min(max(int(request.args.get("limit", HISTORY_DEFAULT_LIMIT)), 1), HISTORY_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"message": "from/to must be ISO-8601 datetimes and limit an integer"}), 400
+    if group not in (None, "day"):
+        return jsonify({"message": "group must be 'day'"}), 400
+
+    if range_start is None and range_end is None:
+        today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        range_start = today - datetime.timedelta(days=HISTORY_DEFAULT_DAYS - 1)
+    date_filter = {}
+    if range_start is not None:
+        date_filter["$gte"] = range_start
+    if range_end is not None:
+        date_filter["$lte"] = range_end
+    query = {"user_id": user_id}
+    if date_filter:
+        query["date"] = date_filter
+
+    # Module code/name come from the cached catalog rather than a per-page lookup
+    catalog = get_module_catalog()
+    cursor = request.args.get("cursor")
+
+    if group == "day":
+        if cursor:
+            try:
+                resume_from = datetime.datetime.strptime(cursor, "%Y-%m-%d") + datetime.timedelta(days=1)
+            except ValueError:
+                return jsonify({"message": "Invalid cursor"}), 400
+            range_start = max(resume_from, range_start or resume_from)
+            query["date"] = {**date_filter, "$gte": range_start}
+        days = {
+            day["_id"]: {"count": day["count"], "module_ids": set(day["module_ids"])}
+            for day in lecture_attendances_collection.aggregate([
+                {"$match": query},
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                    "count": {"$sum": 1},
+                    "module_ids": {"$addToSet": "$module_id"},
+                }},
+                {"$sort": {"_id": 1}},
+                {"$limit": limit + 1},
+            ])
+        }
+        # Older weeks come from rollups; read only until this page's days are complete
+        archived_days = set()
+        archived = []
+        for row in archived_checkins(get_db(), user_id, range_start, range_end):
+            date = row["date"].strftime("%Y-%m-%d")
+            if date not in archived_days and len(archived_days) > limit:
+                break
+            archived_days.add(date)
+            archived.append((date, row))
+        # A row caught mid-archive is in both sources; the hot $group already counted it if it counted that day
+        candidates = [row["_id"] for date, row in archived if date in days]
+        in_both = set()
+        if candidates:
+            in_both = {doc["_id"] for doc in lecture_attendances_collection.find({"_id": {"$in": candidates}}, {"_id": 1})}
+        for date, row in archived:
+            if row["_id"] in in_both:
+                continue
+            day = days.setdefault(date, {"count": 0, "module_ids": set()})
+            day["count"] += 1
+            day["module_ids"].add(row["module_id"])
+
+        page = sorted(days)[:limit + 1]
+        next_cursor = page[limit - 1] if len(page) > limit else None
+        return jsonify({
+            "days": [
+                {"date": date, "count": days[date]["count"], "modules": _history_modules(sorted(days[date]["module_ids"]), catalog)}
+                for date in page[:limit]
+            ],
+            "next_cursor": next_cursor,
+        })
 
-    cursor = lecture_attendances_collection.find({
-        "user_id": user_id,
-        "date": {"$gte": seven_days_ago}
-    }).sort("date", 1)
+    after = None
+    if cursor:
+        try:
+            after = _parse_history_cursor(cursor)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+        # Ties on date are broken by _id, so a page boundary never skips or repeats a row
+        query["$or"] = [{"date": {"$gt": after[0]}}, {"date": after[0], "_id": {"$gt": after[1]}}]
+
+    hot = (
+        lecture_attendances_collection.find(query, {"date": 1, "module_id": 1, "image_id": 1})
+        .sort([("date", 1), ("_id", 1)])
+        .limit(limit + 1)
+    )
+    # Weeks past the hot window were archived into rollups; both sources share the (date, _id) order
+    archived = archived_checkins(get_db(), user_id, range_start, range_end, after)
+    docs = list(islice(merge_checkins(hot, archived), limit + 1))
+    next_cursor = _history_cursor(docs[limit - 1]) if len(docs) > limit else None
 
     history = []
-    for doc in cursor:
+    for doc in docs[:limit]:
+        module = catalog["by_id"].get(doc["module_id"], {})
         history.append({
             "date": doc["date"].isoformat(),
             "module_id": doc["module_id"],
+            "module_code": module.get("code"),
+            "module_name": module.get("name", ""),
             "image_id": doc.get("image_id")
         })
 
-    return jsonify({"history": history})
+    return jsonify({"history": history, "next_cursor": next_cursor})
+
+
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+IMAGE_CACHE_MAX_ITEM_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_ITEM_BYTES", 2 * 1024 * 1024))
+IMAGE_STREAM_CHUNK_SIZE = 64 * 1024
+IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get("IMAGE_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_UPLOAD_URL_TTL_SECONDS = int(os.environ.get("IMAGE_UPLOAD_URL_TTL_SECONDS", 15 * 60))
+# How long an issued-but-never-completed upload keeps its metadata record
+IMAGE_PENDING_TTL = datetime.timedelta(days=1)
+# Image names are random UUIDs that are never rewritten, so clients may keep them forever
+IMAGE_CACHE_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+# Used when a ?size= derivative is still being generated and the original is served instead
+IMAGE_FALLBACK_MAX_AGE_SECONDS = 60
+
+# Hot image bytes keyed by (name, generation), so a rewritten object can never be served stale
+image_cache = ByteLRUCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_ITEM_BYTES)
+
+
+def _image_response(image, body, immutable=True):
+    response = Response(body, mimetype=image.content_type, direct_passthrough=True)
+    response.set_etag(f"{image.name}-{image.generation}")
+    response.last_modified = image.updated
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = IMAGE_CACHE_MAX_AGE_SECONDS
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = IMAGE_FALLBACK_MAX_AGE_SECONDS
+    return response
 
 
 @api.get("/images/<path:filename>")
 def get_image(filename):
+    size = request.args.get("size", type=int)
+    if "size" in request.args and size not in THUMBNAIL_SIZES:
+        return jsonify({"message": f"size must be one of {list(THUMBNAIL_SIZES)}"}), 400
+
     try:
-        storage_client = storage.Client.from_service_account_json(GCP_CREDENTIALS_FILE_PATH)
+        image_storage = get_image_storage()
+
+        image = None
+        is_derivative = False
+        if size:
+            image = image_storage.stat(derivative_name(filename, size))
+            is_derivative = image is not None
+        if image is None:
+            image = image_storage.stat(filename)
+        if image is None:
+            return jsonify({"message": "Image not found"}), 404
+        immutable = is_derivative or not size
 
-        bucket = storage_client.bucket(GCP_IMAGES_BUCKET_NAME)
-        blob = bucket.blob(filename)
+        # Answer revalidations before touching the object's bytes
+        etag = f"{image.name}-{image.generation}"
+        if not is_resource_modified(request.environ, etag=etag, last_modified=image.updated):
+            return _image_response(image, b"", immutable).make_conditional(request)
 
-        if not blob.exists():
-            return jsonify({"message": "Image not found"}), 404
+        cache_key = (image.name, image.generation)
+        image_data = image_cache.get(cache_key)
+        if image_data is None and image_cache.accepts(image.size):
+            image_data = image_storage.read(image.name)
+            image_cache.set(cache_key, image_data)
+
+        if image_data is not None:
+            body = image_data
+        else:
+            body = wrap_file(request.environ, image_storage.open(image.name, image.generation), IMAGE_STREAM_CHUNK_SIZE)
+
+        response = _image_response(image, body, immutable)
+    except Exception as e:
+        metrics.log_error("image_fetch_failed", e, image_id=filename)
+        return jsonify({"message": "Error fetching image"}), 500
+
+    # Handles Range/If-Range, answering 206 or 416 as appropriate
+    return response.make_conditional(request, accept_ranges=True, complete_length=image.size)
+
+def _image_metadata(image_id, user_id, image):
+    return {
+        "_id": image_id,
+        "user_id": user_id,
+        "status": "ready",
+        "content_type": image.content_type,
+        "size": image.size,
+        "generation": image.generation,
+        "uploaded_at": image.updated,
+    }
+
+@api.post("/images/upload_url")
+@token_required
+def create_upload_url(current_user):
+    data = request.get_json(silent=True) or {}
+    content_type = data.get("content_type") or ""
 
-        image_data = blob.download_as_bytes()
+    if not content_type.startswith("image/"):
+        return jsonify({"message": "content_type must be an image type"}), 400
 
-        content_type = blob.content_type or 'application/octet-stream'
+    id = str(uuid.uuid4())
+    try:
+        upload = get_image_storage().signed_upload(
+            id, content_type, IMAGE_UPLOAD_MAX_BYTES, datetime.timedelta(seconds=IMAGE_UPLOAD_URL_TTL_SECONDS)
+        )
+    except Exception as e:
+        metrics.log_error("upload_url_sign_failed", e)
+        return jsonify({"message": "Error creating upload URL"}), 500
+
+    now = datetime.datetime.utcnow()
+    images_collection.insert_one({
+        "_id": id,
+        "user_id": str(current_user["_id"]),
+        "status": "pending",
+        "content_type": content_type,
+        "created_at": now,
+        "pending_until": now + IMAGE_PENDING_TTL,
+    })
+    return jsonify({
+        "uuid": id,
+        "upload_url": upload.url,
+        "method": upload.method,
+        "headers": upload.headers,
+        "expires_at": upload.expires_at.isoformat(),
+    }), 201
 
-        from flask import make_response
-        response = make_response(image_data)
-        response.headers['Content-Type'] = content_type
-        return response
+@api.post("/images/<image_id>/complete")
+@token_required
+def complete_upload(current_user, image_id):
+    record = images_collection.find_one({"_id": image_id, "user_id": str(current_user["_id"])})
+    if not record:
+        return jsonify({"message": "Upload not found"}), 404
+    if record["status"] == "ready":
+        return jsonify({"message": "Image uploaded successfully", "uuid": image_id}), 200
 
+    try:
+        image_storage = get_image_storage()
+        image = image_storage.stat(image_id)
     except Exception as e:
-        print(f"Error fetching image from GCP: {e}")
+        metrics.log_error("image_fetch_failed", e, image_id=image_id)
         return jsonify({"message": "Error fetching image"}), 500
+    if image is None:
+        return jsonify({"message": "Image not found"}), 404
+    if image.content_type != record["content_type"] or image.size > IMAGE_UPLOAD_MAX_BYTES:
+        return jsonify({"message": "Uploaded object does not match the upload URL"}), 400
+
+    metadata = _image_metadata(image_id, record["user_id"], image)
+    images_collection.update_one({"_id": image_id}, {"$set": metadata, "$unset": {"pending_until": ""}})
+    schedule_derivatives(image_storage, image_id)
+
+    return jsonify({"message": "Image uploaded successfully", "uuid": image_id}), 200
+
+@api.put("/images/local_upload/<image_id>")
+def local_upload(image_id):
+    """Stands in for the bucket's signed-URL endpoint when images are stored locally."""
+    image_storage = get_image_storage()
+    if not isinstance(image_storage, LocalImageStorage):
+        return jsonify({"message": "Not found"}), 404
+
+    content_type = request.headers.get("Content-Type", "")
+    try:
+        expires = int(request.args.get("expires", ""))
+        max_bytes = int(request.args.get("max_bytes", ""))
+    except ValueError:
+        return jsonify({"message": "Invalid signature"}), 403
+    if not image_storage.verify_upload(image_id, content_type, max_bytes, expires, request.args.get("signature", "")):
+        return jsonify({"message": "Invalid signature"}), 403
+    if request.content_length is None or request.content_length > max_bytes:
+        return jsonify({"message": "Upload too large"}), 413
+
+    image_storage.upload(image_id, io.BytesIO(request.get_data()), content_type=content_type)
+    return "", 200
 
 @api.post("/images/upload")
 @token_required
@@ -279,14 +817,16 @@ def upload_image(current_user):
     if file:
         try:
             id = str(uuid.uuid4())
-            storage_client = storage.Client.from_service_account_json(GCP_CREDENTIALS_FILE_PATH)
-            bucket = storage_client.bucket(GCP_IMAGES_BUCKET_NAME)
-            blob = bucket.blob(id)
-            blob.upload_from_file(file)
+            image_storage = get_image_storage()
+            data = file.read()
+            image_storage.upload(id, io.BytesIO(data), content_type=file.mimetype)
+            image = image_storage.stat(id)
+            images_collection.insert_one(_image_metadata(id, str(current_user["_id"]), image))
+            schedule_derivatives(image_storage, id, data)
 
             return jsonify({"message": "Image uploaded successfully", "uuid": id}), 201
         except Exception as e:
-            print(f"Error uploading image: {e}")
+            metrics.log_error("image_upload_failed", e)
             return jsonify({"message": "Error uploading image"}), 500
     return None
 
@@ -304,96 +844,314 @@ def join_module(user):
     if not module:
         return jsonify({"message": "Module not found"}), 404
 
-    already_joined = module_participants_collection.find_one({"module_id": str(module["_id"]), "user_id": str(user["_id"])})
-    if already_joined:
+    participant = {"module_id": str(module["_id"]), "user_id": str(user["_id"])}
+    if not _unique_indexes_ready.is_set() and module_participants_collection.find_one(participant, {"_id": 1}):
+        return jsonify({"message": "Already joined module"}), 400
+    try:
+        module_participants_collection.insert_one({**participant, "points": 0})
+    except DuplicateKeyError:
         return jsonify({"message": "Already joined module"}), 400
-
-    module_participants_collection.insert_one({"module_id": str(module["_id"]), "user_id": str(user["_id"]), "points": 0})
     return jsonify({"message": "Successfully joined module"}), 201
 
 
-@api.get("/modules")
-@token_required
-def get_modules(current_user):
-    modules = list(modules_collection.find({}, {"_id": 1, "code": 1, "name": 1}))
-    result = []
-    for module in modules:
-        result.append({
-            "id": str(module["_id"]),
-            "code": module["code"],
-            "name": module.get("name", "")
-        })
-    return jsonify({"modules": result})
+MODULE_CATALOG_TTL_SECONDS = int(os.environ.get("MODULE_CATALOG_TTL_SECONDS", 300))
 
-@api.get("/retrieve_leaderboard")
-@token_required
-def retrieve_leaderboard(current_user):
-    pipeline = []
-    pipeline.extend([
-        {
-            "$group": {
-                "_id": "$user_id",
-                "attendance_count": {"$sum": 1}
-            }
-        },
-        {
-            "$sort": {"attendance_count": -1}
+# The whole module catalog, serialised once per TTL; modules are only ever added out of band
+module_catalog_cache = TTLCache(maxsize=1, ttl=MODULE_CATALOG_TTL_SECONDS)
+
+
+def get_module_catalog():
+    catalog = module_catalog_cache.get("catalog")
+    if catalog is None:
+        modules = [
+            {"id": str(module["_id"]), "code": module["code"], "name": module.get("name", "")}
+            for module in modules_collection.find({}, {"_id": 1, "code": 1, "name": 1}).sort("code", 1)
+        ]
+        body = json.dumps({"modules": modules}).encode()
+        catalog = {
+            "by_id": {module["id"]: module for module in modules},
+            "body": body,
+            # Derived from the content, so every worker hands out the same tag for the same catalog
+            "etag": generate_etag(body),
         }
-    ])
+        module_catalog_cache.set("catalog", catalog)
+    return catalog
+
 
-    leaderboard_entries = list(lecture_attendances_collection.aggregate(pipeline))
+@api.get("/modules")
+@token_required
+def get_modules(current_user):
+    catalog = get_module_catalog()
+    response = Response(catalog["body"], mimetype="application/json")
+    response.set_etag(catalog["etag"])
+    # Revalidate every time; an unchanged catalog costs a 304 and no Mongo query
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+LEADERBOARD_DEFAULT_LIMIT = 50
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_CACHE_TTL_SECONDS = 30
+
+# Pages keyed by (module_id, limit, offset); module_id is None for the global board
+leaderboard_cache = TTLCache(maxsize=256, ttl=LEADERBOARD_CACHE_TTL_SECONDS)
+
+
+def invalidate_leaderboard(module_id: str):
+    leaderboard_cache.invalidate(lambda key: key[0] in (None, module_id))
+
+
+def build_leaderboard(module_id=None, limit=LEADERBOARD_DEFAULT_LIMIT, offset=0):
+    # Both boards read counters maintained by log_attendance, so cost no longer grows with history.
+    # limit=None returns everything from offset on (pymongo treats a limit of 0 as none)
+    if module_id:
+        cursor = module_participants_collection.find(
+            {"module_id": module_id, "attendance_count": {"$gt": 0}},
+            {"user_id": 1, "attendance_count": 1},
+        ).sort([("attendance_count", -1), ("user_id", 1)])
+        leaderboard_entries = [
+            {"_id": doc["user_id"], "attendance_count": doc["attendance_count"]}
+            for doc in cursor.skip(offset).limit(limit or 0)
+        ]
+    else:
+        cursor = attendance_stats_collection.find(
+            {"total": {"$gt": 0}}, {"total": 1}
+        ).sort([("total", -1), ("_id", 1)])
+        leaderboard_entries = [
+            {"_id": doc["_id"], "attendance_count": doc["total"]}
+            for doc in cursor.skip(offset).limit(limit or 0)
+        ]
+
+    # user_id is stored as a string, so resolve the whole page with one $in rather than a $lookup
+    user_ids = [ObjectId(entry["_id"]) for entry in leaderboard_entries if ObjectId.is_valid(entry["_id"])]
+    users = {
+        str(user["_id"]): user
+        for user in users_collection.find({"_id": {"$in": user_ids}}, {"username": 1, "email": 1})
+    }
 
     leaderboard = []
     for entry in leaderboard_entries:
-        user = users_collection.find_one(
-            {"_id": ObjectId(entry["_id"])},
-            {"username": 1, "email": 1}
-        )
+        user = users.get(entry["_id"])
         if user:
             leaderboard.append({
                 "username": user["username"],
                 "email": user["email"],
                 "attendance_count": entry["attendance_count"]
             })
+    return leaderboard
+
+
+@api.get("/retrieve_leaderboard")
+@token_required
+def retrieve_leaderboard(current_user):
+    module_code = request.args.get("module_code")
+    # A module's board is returned whole unless the caller pages it; the global board defaults to one page
+    limit = request.args.get("limit", None if module_code else LEADERBOARD_DEFAULT_LIMIT, type=int)
+    offset = request.args.get("offset", 0, type=int)
+
+    if (limit is not None and limit < 1) or offset < 0:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
+    if limit is not None:
+        limit = min(limit, LEADERBOARD_MAX_LIMIT)
+
+    module_id = None
+    if module_code:
+        module = modules_collection.find_one({"code": module_code}, {"_id": 1})
+        if not module:
+            return jsonify({"message": "Module not found"}), 404
+        module_id = str(module["_id"])
+
+    cache_key = (module_id, limit, offset)
+    leaderboard = leaderboard_cache.get(cache_key)
+    if leaderboard is None:
+        leaderboard = build_leaderboard(module_id, limit, offset)
+        leaderboard_cache.set(cache_key, leaderboard)
+
+    return jsonify({"leaderboard": leaderboard, "limit": limit, "offset": offset})
+
+# Every hour of the forecast horizon, scored once per weather refresh rather than per request
+prediction_service = PredictionService(lambda: get_weather_provider().frame())
+
+
+# Cache lifetime of a /predict response whose description is still being generated
+PROVISIONAL_PREDICT_MAX_AGE_SECONDS = 60
+
+
+def _cache_until_next_hour(response, now, final=True):
+    """Let browsers and proxies reuse `response` until predictions roll over at the top of the hour.
+
+    A response carrying a stand-in description (`final=False`) is only
+    cached briefly, so clients pick up the real one once it is generated.
+    """
+    max_age = max(int((next_hour(now) - now).total_seconds()), 0)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age if final else min(max_age, PROVISIONAL_PREDICT_MAX_AGE_SECONDS)
+    response.add_etag()
+    return response.make_conditional(request)
 
-    return jsonify({"leaderboard": leaderboard})
 
 @api.get("/predict")
 def predict():
-    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-    
-    current_hour = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
-    row = weather_df.loc[current_hour]
-    
-    prediction = predictor.predict(
-        row["temperature"], row["precipitation"], row["cloud_cover"], current_hour.hour, current_hour.weekday()
-    )
-    
+    location = request.args.get("location")
+    now = datetime.datetime.utcnow()
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        prompt = f"""
-Generate a short, engaging 1-sentence description for a student attendance forecast.
-The predicted attendance likelihood is {prediction['likelihood']:.2f} (0-1 scale).
-The weather is {row['temperature']}°C with {row['precipitation']}mm precipitation.
-If likelihood is high (>0.7), be encouraging about the busy campus.
-If likelihood is low (<0.4), mention it might be quiet.
-If rain is high, mention bringing an umbrella.
-Keep it under 20 words.
-        """
-        response = model.generate_content(prompt)
-        description = response.text
-    except Exception as e:
-        print(f"Gemini Error: {e}")
-        description = "Forecast unavailable."
+        with metrics.timed("predictor", "lookup"):
+            entry = prediction_service.at(now, location)
+    except ValueError:
+        return jsonify({"message": "Unknown location"}), 404
+    if entry is None:
+        return jsonify({"message": "No forecast available"}), 503
+
+    prediction, weather = entry["prediction"], entry["weather"]
+    description, final = description_service.describe(prediction["likelihood"], weather["temperature"], weather["precipitation"])
     
-    return jsonify({
+    return _cache_until_next_hour(jsonify({
         "prediction": prediction,
         "description": description,
-        "weather": {
-            "temperature": row["temperature"],
-            "precipitation": row["precipitation"],
-            "cloud_cover": row["cloud_cover"]
-        }
-    })
+        "weather": weather
+    }), now, final)
+
+@api.get("/predict/locations")
+def predict_locations():
+    import predictor
+
+    return jsonify({"locations": predictor.locations()})
+
+def _parse_utc_datetime(value):
+    """Parse an ISO-8601 query parameter into a naive UTC datetime, or None if absent."""
+    if not value:
+        return None
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@api.get("/predict/range")
+def predict_range():
+    try:
+        range_start = _parse_utc_datetime(request.args.get("from"))
+        range_end = _parse_utc_datetime(request.args.get("to"))
+    except ValueError:
+        return jsonify({"message": "from/to must be ISO-8601 datetimes"}), 400
+
+    if range_start and range_end and range_start > range_end:
+        return jsonify({"message": "from must not be after to"}), 400
+
+    try:
+        with metrics.timed("predictor", "lookup"):
+            window = prediction_service.between(range_start, range_end, request.args.get("location"))
+    except ValueError:
+        return jsonify({"message": "Unknown location"}), 404
+
+    forecast = []
+    for hour, entry in window:
+        forecast.append({
+            "time": hour.isoformat(),
+            "likelihood": entry["prediction"]["likelihood"],
+            "predicted_incount": entry["prediction"]["predicted_incount"],
+            "weather": entry["weather"]
+        })
+
+    return _cache_until_next_hour(jsonify({"forecast": forecast}), datetime.datetime.utcnow())
+
+READINESS_TIMEOUT_SECONDS = 2
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+_warm_up_done = threading.Event()
+# Set once ensure_indexes has built every unique index; until then register/join_module also pre-check
+_unique_indexes_ready = threading.Event()
+
+
+def _warm_up():
+    global _warm_up_thread
+    try:
+        ensure_indexes(get_db())
+        _unique_indexes_ready.set()
+        # Loads the model and scores the forecast horizon
+        prediction_service.table()
+        if CHECKIN_FEED_SOURCE == "change_stream":
+            ChangeStreamPublisher(lecture_attendances_collection, checkin_broker, checkin_event_from_change).start()
+        _warm_up_done.set()
+    except Exception as e:
+        metrics.log_error("warm_up_failed", e)
+        # Let the next request or readiness probe try again
+        with _warm_up_lock:
+            _warm_up_thread = None
+
+
+def start_warm_up():
+    """Build indexes, the forecast cache and the model in the background; idempotent and non-blocking."""
+    global _warm_up_thread
+    if _warm_up_thread is None and not _warm_up_done.is_set():
+        with _warm_up_lock:
+            if _warm_up_thread is None and not _warm_up_done.is_set():
+                _warm_up_thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+                _warm_up_thread.start()
+
+
+def _reset_warm_up():
+    global _warm_up_thread
+    with _warm_up_lock:
+        _warm_up_thread = None
+        _warm_up_done.clear()
+        _unique_indexes_ready.clear()
+
+
+@api.before_app_request
+def _ensure_warm_up():
+    start_warm_up()
+
+
+@ops.get("/healthz")
+def liveness():
+    return jsonify({"status": "ok"})
+
+
+@ops.get("/readyz")
+def readiness():
+    checks = {"warm_up": _warm_up_done.is_set(), "unique_indexes": _unique_indexes_ready.is_set()}
+    try:
+        with pymongo.timeout(READINESS_TIMEOUT_SECONDS):
+            get_db().command("ping")
+        checks["mongo"] = True
+    except Exception as e:
+        metrics.log_error("readiness_check_failed", e)
+        checks["mongo"] = False
+    ready = all(checks.values())
+    return jsonify({"status": "ready" if ready else "starting", "checks": checks}), 200 if ready else 503
+
+
+@ops.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def create_app(config=None):
+    """Build the Flask app; nothing connects or loads until first use, so this returns immediately.
+
+    The API's clients are process-wide, so the most recently created app's
+    config is the one they are built from.
+    """
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_secret_key'), # Change this in production!
+        MONGODB_URI=os.environ.get("MONGODB_URI"),
+        MONGODB_DATABASE=os.environ.get("MONGODB_DATABASE", "CoreSystem"),
+    )
+    flask_app.config.update(config or {})
+    services.configure(flask_app.config)
+    _reset_warm_up()
+
+    if TRUSTED_PROXY_HOPS > 0:
+        # request.remote_addr becomes the client address the trusted proxies saw, not the proxy's own
+        flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+
+    CORS(flask_app)
+    flask_app.register_blueprint(ops)
+    flask_app.register_blueprint(api, url_prefix="/api/v1")
+    return flask_app
+
 
-app.register_blueprint(api, url_prefix="/api/v1")
+app = create_app()
@@ -0,0 +1,66 @@
+"""Per-request cost of token_required with a warm principal cache, a cold one and legacy username-only tokens.
+
+Run from backend/: python -m benchmarks.auth_overhead [iterations]
+"""
+from __future__ import annotations
+
+import datetime
+import sys
+import time
+
+import jwt
+
+from benchmarks.stand_ins import boot_app
+
+
+def _time_calls(app_module, protected, token: str, iterations: int, before_each=None) -> tuple[float, int]:
+    calls = {"find_one": 0}
+    users = app_module.users_collection
+    original_find_one = users.find_one
+
+    def counting_find_one(*args, **kwargs):
+        calls["find_one"] += 1
+        return original_find_one(*args, **kwargs)
+
+    users.find_one = counting_find_one
+    try:
+        headers = {"Authorization": f"Bearer {token}"}
+        with app_module.app.test_request_context(headers=headers):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                if before_each:
+                    before_each()
+                protected()
+            elapsed = time.perf_counter() - start
+    finally:
+        del users.find_one
+    return elapsed / iterations * 1e6, calls["find_one"]
+
+
+def main(iterations: int = 5000) -> None:
+    app_module = boot_app()
+    client = app_module.app.test_client()
+    response = client.post("/api/v1/users/register", json={
+        "username": "bench", "email": "bench@example.com", "password": "bench-password"
+    })
+    token = response.get_json()["token"]
+    legacy_token = jwt.encode({
+        "username": "bench",
+        "exp": datetime.datetime.utcnow() + datetime.timedelta(minutes=30)
+    }, app_module.app.config["SECRET_KEY"], algorithm="HS256")
+
+    protected = app_module.token_required(lambda current_user: None)
+
+    scenarios = [
+        ("warm principal cache", token, None),
+        ("cold principal cache", token, app_module.principal_cache.invalidate),
+        ("legacy username token", legacy_token, None),
+    ]
+    print(f"{'scenario':<24}{'us/request':>12}{'user reads':>12}")
+    for name, scenario_token, before_each in scenarios:
+        per_call_us, reads = _time_calls(app_module, protected, scenario_token, iterations, before_each)
+        print(f"{name:<24}{per_call_us:>12.1f}{reads:>12}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,78 @@
+"""Check that importing app stays within a time budget and leaves heavy dependencies unloaded.
+
+Each run imports app in a fresh interpreter with no Mongo, GCS or Gemini
+configuration, so it also catches any import-time connection attempt.
+Exits 1 when the median import exceeds the budget, a deferred module was
+imported eagerly, or a background thread was started.
+
+Run from backend/: python -m benchmarks.import_budget [--budget-ms 600] [--runs 5]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.stand_ins import BACKEND_DIR
+
+# Only needed once a request (or the warm-up) asks for them
+DEFERRED_MODULES = ("pandas", "numpy", "google.cloud.storage", "google.generativeai", "predictor", "weather")
+
+_PROBE = f"""
+import json, sys, threading, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+import services
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+    "threads": [t.name for t in threading.enumerate() if t is not threading.main_thread()],
+    "mongo_client": services._client is not None,
+}}))
+"""
+
+
+def measure() -> dict:
+    env = {k: v for k, v in os.environ.items() if k not in ("MONGODB_URI", "GEMINI_API_KEY")}
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check(runs: int = 5, budget_ms: float = float(os.environ.get("IMPORT_BUDGET_MS", "600"))) -> tuple[float, list[str]]:
+    """Measure `runs` fresh imports; returns the median in ms and a list of budget violations."""
+    results = [measure() for _ in range(runs)]
+    median_ms = statistics.median(result["ms"] for result in results)
+    problems = []
+    if median_ms > budget_ms:
+        problems.append(f"median import {median_ms:.0f}ms exceeds the {budget_ms:.0f}ms budget")
+    first = results[0]
+    if first["loaded"]:
+        problems.append(f"imported eagerly: {', '.join(first['loaded'])}")
+    if first["threads"]:
+        problems.append(f"started threads at import: {', '.join(first['threads'])}")
+    if first["mongo_client"]:
+        problems.append("created a MongoClient at import")
+    return median_ms, problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time budget check for app.py")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", "600")))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    median_ms, problems = check(args.runs, args.budget_ms)
+    print(f"import app: median {median_ms:.0f}ms over {args.runs} runs (budget {args.budget_ms:.0f}ms)")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Update cost and hold-out accuracy of the per-location model against the all-sites full refit.
+
+The latest weekly CSV is held out. Both models are trained on the earlier
+weeks and scored on the held-out week's hourly totals (the per-location
+model by summing its locations). Then the cost of taking the new week on
+board is timed: a cold full refit of the all-sites model, a cold rebuild
+of the location statistics, and an online update that folds only the new
+week into the stored statistics and re-solves.
+
+Run from backend/: python -m benchmarks.location_model [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import location_model
+import predictor
+import training_data
+
+
+def _median_ms(fn, repeat: int, setup=None) -> float:
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def _global_predictions(model: predictor.FootfallModel, hourly: training_data.HourlyData) -> np.ndarray:
+    days = hourly.hour.astype("datetime64[D]")
+    features = {
+        "temperature": hourly.temperature,
+        "precipitation": hourly.precipitation,
+        "cloud_cover": hourly.cloud_cover,
+        "hour": (hourly.hour - days).astype(int),
+        "dow": (days.astype(int) + 3) % 7,
+    }
+    import pandas as pd
+
+    X = predictor._build_feature_matrix(model, pd.DataFrame(features))
+    return model.beta[0] + X @ model.beta[1:]
+
+
+def _location_predictions(fits, hourly: training_data.HourlyData) -> np.ndarray:
+    X = location_model.design_matrix(
+        location_model.hour_of_week(hourly.hour), hourly.temperature, hourly.precipitation, hourly.cloud_cover
+    )
+    return sum(X @ fit.beta for fit in fits.values())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-location model vs all-sites full refit")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = predictor._dataset_files()
+    weather_file, footfall_files = files[-1], files[:-1]
+    # File names don't sort chronologically, so order the weeks by their first hour
+    footfall_files.sort(key=lambda path: training_data.read_footfall_rows(path)["hour"].min())
+    history, latest = footfall_files[:-1], footfall_files[-1]
+
+    scratch = Path(tempfile.mkdtemp(prefix="bepresent-location-model-"))
+    history_store, full_store, holdout_store = scratch / "history", scratch / "full", scratch / "holdout"
+    training_data.update_store(history_store, history, weather_file)
+    training_data.update_store(holdout_store, [latest], weather_file)
+    holdout = training_data.load_hourly(holdout_store)
+
+    global_model = predictor.fit_model(training_data.load_hourly(history_store))
+    location_fits = location_model.fit_all(training_data.load_location_stats(history_store))
+    actual = holdout.in_count
+    errors = {
+        "all-sites linear (hour numeric)": _global_predictions(global_model, holdout) - actual,
+        "per-location hour-of-week": _location_predictions(location_fits, holdout) - actual,
+    }
+
+    print(f"Trained on {len(history)} weeks, scored on {latest.name} ({len(holdout)} hours, mean {actual.mean():.0f}/hour)")
+    print(f"{'model':<34}{'MAE':>10}{'RMSE':>10}")
+    for name, error in errors.items():
+        print(f"{name:<34}{np.abs(error).mean():>10.1f}{np.sqrt((error ** 2).mean()):>10.1f}")
+
+    def reset_full_store():
+        shutil.rmtree(full_store, ignore_errors=True)
+
+    def seed_online_store():
+        shutil.rmtree(full_store, ignore_errors=True)
+        shutil.copytree(history_store, full_store)
+
+    def full_refit():
+        training_data.update_store(full_store, footfall_files, weather_file)
+        predictor.fit_model(training_data.load_hourly(full_store))
+
+    def location_rebuild():
+        training_data.update_store(full_store, footfall_files, weather_file)
+        location_model.fit_all(training_data.load_location_stats(full_store))
+
+    print(f"\nTaking week {len(footfall_files)} on board (median of {args.repeat}):")
+    print(f"  all-sites full refit from CSVs      {_median_ms(full_refit, args.repeat, reset_full_store):8.1f} ms")
+    print(f"  per-location rebuild from CSVs      {_median_ms(location_rebuild, args.repeat, reset_full_store):8.1f} ms")
+    print(f"  per-location online update         {_median_ms(location_rebuild, args.repeat, seed_online_store):8.1f} ms")
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
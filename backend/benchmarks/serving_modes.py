@@ -0,0 +1,181 @@
+"""Load test of the gthread (thread-per-request) and gevent worker classes at equal worker counts.
+
+Each mode boots gunicorn against the stand-ins with BENCH_IO_LATENCY_MS added
+to every Mongo and storage call, then drives the same mix of authenticated
+attendance, image and prediction requests from concurrent clients.
+
+Run from backend/: python -m benchmarks.serving_modes [--clients 64] [--duration 10] [--latency-ms 20]
+Requires gunicorn, gevent and mongomock.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import jwt
+import requests
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SECRET_KEY = "bench-secret-bench-secret-bench-secret"
+BENCH_USER_ID = "65f000000000000000000001"
+BENCH_IMAGE_ID = "bench-image"
+PATHS = (
+    "/api/v1/count_attendance",
+    f"/api/v1/images/{BENCH_IMAGE_ID}",
+    "/api/v1/predict",
+)
+
+
+def wsgi_app():
+    """gunicorn factory: the stand-in app with injected I/O latency and a seeded bench user.
+
+    Every gunicorn worker gets its own in-memory database, so fixtures are
+    seeded per worker with fixed ids rather than through the API.
+    """
+    import mongomock
+    from bson import ObjectId
+
+    from benchmarks.stand_ins import add_latency, boot_app
+
+    app_module = boot_app()
+    from image_storage import LocalImageStorage
+
+    app_module.users_collection.insert_one({"_id": ObjectId(BENCH_USER_ID), "username": "bench", "email": "bench@example.com"})
+    app_module.attendance_stats_collection.insert_one({"_id": BENCH_USER_ID, "total": 3})
+
+    latency = float(os.environ.get("BENCH_IO_LATENCY_MS", "0")) / 1000
+    if latency:
+        add_latency(mongomock.collection.Collection, ("find_one", "find", "insert_one", "update_one", "aggregate"), latency)
+        add_latency(LocalImageStorage, ("stat", "exists", "read", "open", "upload"), latency)
+    return app_module.app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            requests.get(f"{base_url}/api/v1/predict", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not come up in time")
+
+
+def _drive(base_url: str, token: str, clients: int, duration: float) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset: int) -> None:
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+        local, failed, i = [], 0, offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = session.get(base_url + PATHS[i % len(PATHS)], timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            local.append(time.perf_counter() - start)
+            failed += not ok
+            i += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run_mode(worker_class: str, args, scratch: str, token: str) -> dict:
+    port = _free_port()
+    env = {
+        **os.environ,
+        "SECRET_KEY": SECRET_KEY,
+        "WORKER_CLASS": worker_class,
+        "WEB_CONCURRENCY": str(args.workers),
+        # mongomock has no change streams, and each worker has its own database anyway
+        "CHECKIN_FEED_SOURCE": "local",
+        "WORKER_THREADS": str(args.threads),
+        "BIND": f"127.0.0.1:{port}",
+        "BENCH_IO_LATENCY_MS": str(args.latency_ms),
+        "LOCAL_IMAGE_STORAGE_DIR": os.path.join(scratch, "images"),
+        "WEATHER_SNAPSHOT_PATH": os.path.join(scratch, "weather_snapshot.json"),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "benchmarks.serving_modes:wsgi_app()"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_up(base_url, server)
+        _drive(base_url, token, args.clients, 1)  # warm caches on every worker
+        latencies, errors = _drive(base_url, token, args.clients, args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "mode": worker_class,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare gthread and gevent gunicorn workers under I/O latency")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from image_storage import LocalImageStorage
+
+    scratch = tempfile.mkdtemp(prefix="bepresent-serving-")
+    LocalImageStorage(os.path.join(scratch, "images")).upload(BENCH_IMAGE_ID, io.BytesIO(b"\xff\xd8" + b"\0" * 4096), content_type="image/jpeg")
+    token = jwt.encode({
+        "sub": BENCH_USER_ID,
+        "username": "bench",
+        "type": "access",
+        "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+    }, SECRET_KEY, algorithm="HS256")
+
+    print(f"{args.workers} workers, {args.clients} clients, {args.latency_ms:g}ms per Mongo/storage call")
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for worker_class in ("gthread", "gevent"):
+        result = run_mode(worker_class, args, scratch, token)
+        print(f"{result['mode']:<10}{result['rps']:>10.0f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
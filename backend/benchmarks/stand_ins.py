@@ -0,0 +1,80 @@
+"""Boot app.py against in-process stand-ins so benchmarks run without network or cloud credentials.
+
+Mongo is mongomock, GCS is LocalImageStorage on a scratch directory, Gemini
+is FakeDescriptionClient and Open-Meteo is a local HTTP stub. Requires
+mongomock (`pip install mongomock`), which is only needed for benchmarking.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+class _OpenMeteoHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        start = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        hours = [start + datetime.timedelta(hours=h) for h in range(7 * 24)]
+        body = json.dumps({"hourly": {
+            "time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours],
+            "temperature_2m": [round(6 + h.hour / 3, 1) for h in hours],
+            "precipitation": [0.6 if h.hour % 5 == 0 else 0.0 for h in hours],
+            "cloud_cover": [(h.hour * 7) % 100 for h in hours],
+        }}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_open_meteo_stub() -> str:
+    """Serve a synthetic week-long hourly forecast on a free local port, returning its URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OpenMeteoHandler)
+    threading.Thread(target=server.serve_forever, name="open-meteo-stub", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1/forecast"
+
+
+def boot_app():
+    """Import and return the `app` module wired to the stand-ins."""
+    import mongomock
+    import pymongo
+
+    scratch = tempfile.mkdtemp(prefix="bepresent-bench-")
+    os.environ.setdefault("MONGODB_URI", "mongodb://stand-in")
+    os.environ.setdefault("IMAGE_STORAGE_BACKEND", "local")
+    os.environ.setdefault("LOCAL_IMAGE_STORAGE_DIR", os.path.join(scratch, "images"))
+    os.environ.setdefault("DESCRIPTION_BACKEND", "fake")
+    os.environ.setdefault("WEATHER_SNAPSHOT_PATH", os.path.join(scratch, "weather_snapshot.json"))
+    if "OPEN_METEO_URL" not in os.environ:
+        os.environ["OPEN_METEO_URL"] = start_open_meteo_stub()
+
+    pymongo.MongoClient = mongomock.MongoClient
+    sys.path.insert(0, str(BACKEND_DIR))
+    import app
+
+    return app
+
+
+def add_latency(cls, names, seconds: float) -> None:
+    """Make each of `cls`'s `names` methods sleep `seconds` first, standing in for a network round trip."""
+    for name in names:
+        original = getattr(cls, name)
+
+        def delayed(*args, _original=original, **kwargs):
+            # time.sleep is looked up per call so gevent's patched sleep is used under the gevent worker
+            time.sleep(seconds)
+            return _original(*args, **kwargs)
+
+        setattr(cls, name, delayed)
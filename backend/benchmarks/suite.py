@@ -0,0 +1,197 @@
+"""Scenario load tests against the stand-ins, recording per-endpoint throughput and latency percentiles as JSON.
+
+Scenarios:
+  checkin_storm        every student uploads a photo through a signed URL and logs attendance at lecture start
+  leaderboard_polling  clients repeatedly poll the home-page and module leaderboards
+  image_fanout         every student loads a page of classmates' avatar thumbnails
+
+Run from backend/: python -m benchmarks.suite [--students 200] [--concurrency 16] [--output results.json]
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from urllib.parse import urlsplit
+
+from bson import ObjectId
+
+from benchmarks.stand_ins import boot_app
+
+MODULE_CODE = "BENCH101"
+
+
+class Recorder:
+    """Thread-safe collection of (endpoint, seconds, ok) samples for one scenario."""
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, endpoint: str, fn: Callable):
+        start = time.perf_counter()
+        response = fn()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._samples[endpoint].append(elapsed)
+            if response.status_code >= 400:
+                self._errors[endpoint] += 1
+        return response
+
+    def summary(self, wall_seconds: float) -> Dict[str, Dict[str, float]]:
+        endpoints = {}
+        for endpoint, samples in sorted(self._samples.items()):
+            quantiles = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+            endpoints[endpoint] = {
+                "count": len(samples),
+                "errors": self._errors[endpoint],
+                "throughput_rps": round(len(samples) / wall_seconds, 1),
+                "p50_ms": round(quantiles[49] * 1000, 2),
+                "p95_ms": round(quantiles[94] * 1000, 2),
+                "p99_ms": round(quantiles[98] * 1000, 2),
+            }
+        return endpoints
+
+
+def _photo(seed: int) -> bytes:
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", (1024, 768), ((seed * 37) % 256, (seed * 91) % 256, 160)).save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+class Bench:
+    def __init__(self, app_module, students: int, concurrency: int):
+        self.app = app_module
+        self.concurrency = concurrency
+        self.image_ids: List[str] = []
+        self._local = threading.local()
+
+        module_id = app_module.modules_collection.insert_one({"code": MODULE_CODE, "name": "Benchmarking"}).inserted_id
+        self.tokens = []
+        with app_module.app.app_context():
+            for n in range(students):
+                user_id = ObjectId()
+                app_module.users_collection.insert_one({"_id": user_id, "username": f"student{n}", "email": f"student{n}@example.com"})
+                app_module.module_participants_collection.insert_one({"module_id": str(module_id), "user_id": str(user_id), "points": 0})
+                self.tokens.append(app_module.generate_token(str(user_id), f"student{n}"))
+
+    def client(self):
+        # One test client per worker thread
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.app.test_client()
+        return self._local.client
+
+    def run(self, jobs: List[Callable[[Recorder], None]]) -> Dict[str, object]:
+        recorder = Recorder()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for future in [executor.submit(job, recorder) for job in jobs]:
+                future.result()
+        wall = time.perf_counter() - start
+        return {"wall_seconds": round(wall, 3), "endpoints": recorder.summary(wall)}
+
+    def checkin_storm(self) -> Dict[str, object]:
+        photos = [_photo(n) for n in range(8)]
+        lock = threading.Lock()
+
+        def check_in(n: int, recorder: Recorder) -> None:
+            headers = {"Authorization": f"Bearer {self.tokens[n]}"}
+            upload = recorder.call("POST /images/upload_url", lambda: self.client().post(
+                "/api/v1/images/upload_url", headers=headers, json={"content_type": "image/jpeg"},
+            )).get_json()
+            image_id = upload["uuid"]
+            # The bucket's signed-URL endpoint, stood in for by the API's own local_upload route
+            signed_url = urlsplit(upload["upload_url"])
+            recorder.call("PUT <signed upload url>", lambda: self.client().open(
+                f"{signed_url.path}?{signed_url.query}", method=upload["method"],
+                headers=upload["headers"], data=photos[n % len(photos)],
+            ))
+            recorder.call("POST /images/<id>/complete", lambda: self.client().post(
+                f"/api/v1/images/{image_id}/complete", headers=headers,
+            ))
+            with lock:
+                self.image_ids.append(image_id)
+            recorder.call("POST /log_attendance", lambda: self.client().post(
+                "/api/v1/log_attendance", headers=headers, json={"module_code": MODULE_CODE, "image_id": image_id},
+            ))
+
+        result = self.run([lambda recorder, n=n: check_in(n, recorder) for n in range(len(self.tokens))])
+        self._wait_for_thumbnails()
+        return result
+
+    def leaderboard_polling(self, polls_per_student: int = 5) -> Dict[str, object]:
+        def poll(n: int, recorder: Recorder) -> None:
+            headers = {"Authorization": f"Bearer {self.tokens[n]}"}
+            for _ in range(polls_per_student):
+                recorder.call("GET /retrieve_leaderboard?limit=3", lambda: self.client().get(
+                    "/api/v1/retrieve_leaderboard?limit=3", headers=headers,
+                ))
+                recorder.call("GET /retrieve_leaderboard?module_code", lambda: self.client().get(
+                    f"/api/v1/retrieve_leaderboard?module_code={MODULE_CODE}", headers=headers,
+                ))
+
+        return self.run([lambda recorder, n=n: poll(n, recorder) for n in range(len(self.tokens))])
+
+    def image_fanout(self, page_size: int = 10) -> Dict[str, object]:
+        rng = random.Random(0)
+
+        def load_page(n: int, recorder: Recorder) -> None:
+            for image_id in rng.sample(self.image_ids, min(page_size, len(self.image_ids))):
+                recorder.call("GET /images/<id>?size=96", lambda: self.client().get(f"/api/v1/images/{image_id}?size=96"))
+
+        return self.run([lambda recorder, n=n: load_page(n, recorder) for n in range(len(self.tokens))])
+
+    def _wait_for_thumbnails(self, timeout: float = 120) -> None:
+        import thumbnails
+
+        if thumbnails.Image is None:
+            return
+        storage = self.app.get_image_storage()
+        names = [thumbnails.derivative_name(image_id, min(thumbnails.THUMBNAIL_SIZES)) for image_id in self.image_ids]
+        deadline = time.monotonic() + timeout
+        while len(storage.existing(names)) < len(names) and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+
+SCENARIOS = ("checkin_storm", "leaderboard_polling", "image_fanout")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="BePresent API benchmark suite")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="write results JSON here as well as stdout")
+    args = parser.parse_args()
+
+    bench = Bench(boot_app(), args.students, args.concurrency)
+    # image_fanout reads the photos uploaded during checkin_storm, so scenarios always run in this order
+    results = {
+        "meta": {
+            "students": args.students,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scenarios": {name: getattr(bench, name)() for name in SCENARIOS},
+    }
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
+    print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """Drop every entry, or only those whose key matches `predicate`."""
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class ByteLRUCache:
+    """Thread-safe LRU for immutable byte payloads, capped by total size rather than entry count."""
+
+    def __init__(self, max_bytes: int, max_item_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes if max_item_bytes is None else max_item_bytes
+        self.current_bytes = 0
+        self._data: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= self.max_item_bytes
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: bytes) -> None:
+        if not self.accepts(len(value)):
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+            self._data[key] = value
+            self.current_bytes += len(value)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+
+def cooperative() -> bool:
+    """True when running under gevent's monkey-patching (e.g. gunicorn's gevent worker)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def native_thread_pool(max_workers: int, thread_name_prefix: str = "") -> Executor:
+    """A pool of real OS threads for CPU-bound work.
+
+    Under gevent a plain ThreadPoolExecutor runs its jobs as greenlets, so a
+    CPU-heavy job would stall every request on the worker; gevent's own
+    executor keeps them on native threads instead.
+    """
+    if cooperative():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
@@ -0,0 +1,185 @@
+"""Denormalised attendance counters maintained on every check-in.
+
+attendance_stats holds one document per user (keyed by the user id string):
+
+    {_id, total, modules: {module_id: n}, day: "YYYY-MM-DD", day_count,
+     week: "YYYY-Www", week_count, current_streak, last_day}
+
+Only the latest day and week are kept (the API shows today's and this
+week's counts), so the document stays the same size however long the
+user has been checking in.
+
+and each module_participants document carries attendance_count and points
+for its module. Streaks count consecutive weekdays, so weekends never break
+one. `python counters.py rebuild` recomputes everything from
+lecture_attendances and the archived weeks in attendance_rollups.
+"""
+from __future__ import annotations
+
+import datetime
+import heapq
+import os
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from rollups import all_archived_checkins
+
+ATTENDANCE_STATS_COLLECTION = "attendance_stats"
+POINTS_PER_ATTENDANCE = 10
+
+
+def day_key(day: datetime.date) -> str:
+    return day.strftime("%Y-%m-%d")
+
+
+def week_key(day: datetime.date) -> str:
+    iso = day.isocalendar()
+    return f"{iso.year}-W{iso.week:02d}"
+
+
+def previous_weekday(day: datetime.date) -> datetime.date:
+    day -= datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= datetime.timedelta(days=1)
+    return day
+
+
+def _count_in_period(stats: Collection, user_id: str, field: str, key: str) -> None:
+    """Count one check-in towards the user's latest `field` period, moving on to `key` if it is newer."""
+    for _ in range(2):
+        if stats.update_one({"_id": user_id, field: key}, {"$inc": {f"{field}_count": 1}}).matched_count:
+            return
+        # A late-synced check-in from an earlier period matches neither filter; only the latest period is shown
+        if stats.update_one(
+            {"_id": user_id, field: {"$not": {"$gte": key}}}, {"$set": {field: key, f"{field}_count": 1}},
+        ).matched_count:
+            return
+        # A concurrent check-in started this period between the two updates; count this one in it
+
+
+def record_attendance(db: Database, user_id: str, module_id: str, when: datetime.datetime) -> None:
+    """Fold one new check-in into the user's and the participant's counters using atomic updates."""
+    stats = db[ATTENDANCE_STATS_COLLECTION]
+    today = day_key(when.date())
+
+    # Drops the per-day/per-week maps of the old layout as users check in
+    stats.update_one(
+        {"_id": user_id},
+        {"$inc": {"total": 1, f"modules.{module_id}": 1}, "$unset": {"days": "", "weeks": ""}},
+        upsert=True,
+    )
+    _count_in_period(stats, user_id, "day", today)
+    _count_in_period(stats, user_id, "week", week_key(when.date()))
+
+    # Extend the streak if the user last attended on or after the previous weekday, otherwise restart it;
+    # a second check-in on the same (or an earlier) day matches neither filter and leaves it alone.
+    extended = stats.update_one(
+        {"_id": user_id, "last_day": {"$gte": day_key(previous_weekday(when.date())), "$lt": today}},
+        {"$inc": {"current_streak": 1}, "$set": {"last_day": today}},
+    )
+    if not extended.matched_count:
+        # Only restart from a strictly earlier day, so a late-synced older check-in can't rewind the streak
+        stats.update_one(
+            {"_id": user_id, "last_day": {"$not": {"$gte": today}}},
+            {"$set": {"current_streak": 1, "last_day": today}},
+        )
+
+    db["module_participants"].update_one(
+        {"user_id": user_id, "module_id": module_id},
+        {"$inc": {"attendance_count": 1, "points": POINTS_PER_ATTENDANCE}},
+    )
+
+
+def current_streak(stats: Optional[Dict[str, Any]], today: datetime.date) -> int:
+    """The stored streak, or 0 once the user has missed a weekday since it was last extended."""
+    if not stats or not stats.get("last_day"):
+        return 0
+    if stats["last_day"] >= day_key(previous_weekday(today)):
+        return int(stats.get("current_streak", 0))
+    return 0
+
+
+def summarise(stats: Optional[Dict[str, Any]], today: datetime.date) -> Dict[str, Any]:
+    stats = stats or {}
+    return {
+        "total": int(stats.get("total", 0)),
+        "today": int(stats.get("day_count", 0)) if stats.get("day") == day_key(today) else 0,
+        "this_week": int(stats.get("week_count", 0)) if stats.get("week") == week_key(today) else 0,
+        "current_streak": current_streak(stats, today),
+        "modules": dict(stats.get("modules", {})),
+    }
+
+
+def rebuild_counters(db: Database) -> int:
+    """Recompute every counter from lecture_attendances and its rollups; returns the number of users with stats."""
+    per_user: Dict[str, Dict[str, Any]] = {}
+    per_participant: Dict[tuple[str, str], int] = defaultdict(int)
+
+    cursor = db["lecture_attendances"].find({}, {"user_id": 1, "module_id": 1, "date": 1}).sort([("user_id", 1), ("date", 1)])
+    # Archived weeks live in rollups now; a row caught mid-archive can be in both, so skip repeated ids
+    seen = set()
+    for doc in heapq.merge(cursor, all_archived_checkins(db), key=lambda doc: (doc["user_id"], doc["date"])):
+        if doc["_id"] in seen:
+            continue
+        seen.add(doc["_id"])
+        user_id, module_id, day = doc["user_id"], doc["module_id"], doc["date"].date()
+        stats = per_user.setdefault(user_id, {
+            "_id": user_id, "total": 0, "modules": defaultdict(int), "day": None, "day_count": 0,
+            "week": None, "week_count": 0, "current_streak": 0, "last_day": None,
+        })
+        stats["total"] += 1
+        stats["modules"][module_id] += 1
+        for field, key in (("day", day_key(day)), ("week", week_key(day))):
+            if stats[field] != key:
+                stats[field], stats[f"{field}_count"] = key, 0
+            stats[f"{field}_count"] += 1
+        if stats["last_day"] != day_key(day):
+            if stats["last_day"] and stats["last_day"] >= day_key(previous_weekday(day)):
+                stats["current_streak"] += 1
+            else:
+                stats["current_streak"] = 1
+            stats["last_day"] = day_key(day)
+        per_participant[(user_id, module_id)] += 1
+
+    stats_collection = db[ATTENDANCE_STATS_COLLECTION]
+    requests = [
+        ReplaceOne({"_id": user_id}, {**stats, "modules": dict(stats["modules"])}, upsert=True)
+        for user_id, stats in per_user.items()
+    ]
+    if requests:
+        stats_collection.bulk_write(requests, ordered=False)
+    stats_collection.delete_many({"_id": {"$nin": list(per_user)}})
+
+    participant_requests = []
+    for participant in db["module_participants"].find({}, {"user_id": 1, "module_id": 1}):
+        count = per_participant.get((participant["user_id"], participant["module_id"]), 0)
+        participant_requests.append(UpdateOne(
+            {"_id": participant["_id"]},
+            {"$set": {"attendance_count": count, "points": count * POINTS_PER_ATTENDANCE}},
+        ))
+    if participant_requests:
+        db["module_participants"].bulk_write(participant_requests, ordered=False)
+
+    return len(per_user)
+
+
+def main() -> None:
+    import argparse
+    import certifi
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Attendance counter maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    client = MongoClient(os.environ["MONGODB_URI"], tls=True, tlsCAFile=certifi.where())
+    users = rebuild_counters(client["CoreSystem"])
+    print(f"Rebuilt attendance counters for {users} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import datetime
+import os
+import sys
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+from metrics import log_error
+
+# Every index the API relies on, per collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "modules": [
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True),
+    ],
+    "module_participants": [
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING)], name="user_module_unique", unique=True),
+        # Per-module leaderboard
+        IndexModel([("module_id", ASCENDING), ("attendance_count", DESCENDING), ("user_id", ASCENDING)], name="module_attendance_count"),
+    ],
+    "images": [
+        # Upload URLs that were issued but never completed
+        IndexModel([("pending_until", ASCENDING)], name="pending_expiry", expireAfterSeconds=0),
+    ],
+    "attendance_rollups": [
+        # Upsert key for rollups.archive, and a user's weeks in order for history and counter rebuilds
+        IndexModel([("user_id", ASCENDING), ("week_start", ASCENDING), ("module_id", ASCENDING)], name="user_week_module_unique", unique=True),
+    ],
+    "attendance_stats": [
+        # Global leaderboard
+        IndexModel([("total", DESCENDING), ("_id", ASCENDING)], name="total"),
+    ],
+    "lecture_attendances": [
+        # Duplicate-check in log_attendance
+        IndexModel([("user_id", ASCENDING), ("module_id", ASCENDING), ("date", ASCENDING)], name="user_module_date"),
+        # Today's classmates, newest first
+        IndexModel([("module_id", ASCENDING), ("date", DESCENDING)], name="module_date"),
+        # attendance_history pages, ordered by (date, _id)
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)], name="user_date_id"),
+        # rollups.archive, oldest first
+        IndexModel([("date", ASCENDING)], name="date"),
+        # Client-supplied keys that make /log_attendance/batch retries idempotent
+        IndexModel(
+            [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            name="user_idempotency_key_unique",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+        ),
+    ],
+}
+
+
+class UniqueIndexError(RuntimeError):
+    """A unique index the API relies on for duplicate checks could not be built."""
+
+
+def ensure_indexes(db: Database) -> None:
+    """Create any missing indexes; existing ones with the same spec are left untouched.
+
+    A failed ordinary index only costs performance and is reported, but
+    register/join_module/the batch endpoint rely on the unique ones (falling
+    back to find-then-insert checks until they're built), so UniqueIndexError
+    is raised if any of those can't be built (e.g. production already holds
+    duplicates) and readiness stays down.
+    """
+    failed_unique = []
+    for collection_name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                db[collection_name].create_indexes([index])
+            except PyMongoError as e:
+                log_error("index_build_failed", e, collection=collection_name, index=index.document["name"])
+                if index.document.get("unique"):
+                    failed_unique.append(f"{collection_name}.{index.document['name']}")
+    if failed_unique:
+        raise UniqueIndexError(f"Unique indexes not built: {', '.join(failed_unique)}")
+
+
+def _hot_queries() -> List[Dict[str, Any]]:
+    """Representative shapes of the queries issued on every request path."""
+    today_start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today_start + datetime.timedelta(days=1)
+    user_id = "000000000000000000000000"
+    module_id = "000000000000000000000001"
+    return [
+        {"collection": "users", "filter": {"$or": [{"email": "someone@example.com"}, {"username": "someone"}]}},
+        {"collection": "users", "filter": {"username": "someone"}},
+        {"collection": "modules", "filter": {"code": "COMP0000"}},
+        {"collection": "module_participants", "filter": {"user_id": user_id, "module_id": module_id}},
+        {"collection": "images", "filter": {"_id": "00000000-0000-0000-0000-000000000000", "user_id": user_id, "status": "ready"}},
+        {
+            "collection": "lecture_attendances",
+            "filter": {"user_id": user_id, "module_id": module_id, "date": {"$gte": today_start, "$lte": today_end}},
+        },
+        {
+            "collection": "lecture_attendances",
+            "filter": {"module_id": module_id, "date": {"$gte": today_start, "$lte": today_end}, "user_id": {"$ne": user_id}},
+            "sort": [("date", DESCENDING)],
+        },
+        {
+            "collection": "lecture_attendances",
+            "filter": {"user_id": user_id, "date": {"$gte": today_start - datetime.timedelta(days=6)}},
+            "sort": [("date", ASCENDING), ("_id", ASCENDING)],
+        },
+        {
+            "collection": "attendance_rollups",
+            "filter": {"user_id": user_id, "week_start": {"$gte": today_start - datetime.timedelta(weeks=12)}},
+            "sort": [("week_start", ASCENDING), ("module_id", ASCENDING)],
+        },
+        {
+            "collection": "module_participants",
+            "filter": {"module_id": module_id, "attendance_count": {"$gt": 0}},
+            "sort": [("attendance_count", DESCENDING), ("user_id", ASCENDING)],
+        },
+        {
+            "collection": "attendance_stats",
+            "filter": {"total": {"$gt": 0}},
+            "sort": [("total", DESCENDING), ("_id", ASCENDING)],
+        },
+    ]
+
+
+def _stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_stages(child))
+    return stages
+
+
+def find_uncovered_queries(db: Database) -> List[str]:
+    """Explain every hot query and describe those whose winning plan scans a whole collection or sorts in memory."""
+    problems = []
+    for query in _hot_queries():
+        cursor = db[query["collection"]].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = _stages(winning_plan)
+        bad_stages = [stage for stage in stages if stage in ("COLLSCAN", "SORT")]
+        if bad_stages:
+            problems.append(f"{query['collection']} {query['filter']}: {', '.join(bad_stages)}")
+    return problems
+
+
+def main() -> None:
+    from pymongo import MongoClient
+    import certifi
+
+    client = MongoClient(os.environ["MONGODB_URI"], tls=True, tlsCAFile=certifi.where())
+    db = client["CoreSystem"]
+    try:
+        ensure_indexes(db)
+    except UniqueIndexError as e:
+        print(e)
+        sys.exit(1)
+
+    problems = find_uncovered_queries(db)
+    for problem in problems:
+        print(f"Not index-backed: {problem}")
+    if problems:
+        sys.exit(1)
+    print("All hot queries are index-backed")
+
+
+if __name__ == "__main__":
+    main()
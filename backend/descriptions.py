@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Dict, Optional, Tuple
+
+from cache import TTLCache
+from metrics import log_error, timed
+
+GEMINI_MODEL_NAME = os.environ.get("GEMINI_MODEL_NAME", "gemini-pro")
+# How long /predict will wait for a fresh description before using the template
+DESCRIPTION_WAIT_SECONDS = float(os.environ.get("DESCRIPTION_WAIT_SECONDS", "0"))
+DESCRIPTION_LLM_TIMEOUT_SECONDS = float(os.environ.get("DESCRIPTION_LLM_TIMEOUT_SECONDS", "10"))
+DESCRIPTION_CACHE_TTL_SECONDS = 6 * 60 * 60
+DESCRIPTION_FAILURE_TTL_SECONDS = 5 * 60
+DESCRIPTION_WORKERS = 2
+
+LIKELIHOOD_BUCKET = 0.1
+TEMPERATURE_BUCKET = 5.0
+RAIN_THRESHOLD_MM = 0.5
+
+DescriptionKey = tuple[int, int, bool]
+
+
+class DescriptionClient:
+    """Anything that can turn a prompt into a short piece of text."""
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+
+class GeminiDescriptionClient(DescriptionClient):
+    def __init__(self, api_key: str, model_name: str = GEMINI_MODEL_NAME, timeout: float = DESCRIPTION_LLM_TIMEOUT_SECONDS):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.timeout = timeout
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    # REST goes through requests, which gevent's monkey-patching makes cooperative;
+                    # the default gRPC transport would block the worker's whole event loop per call
+                    genai.configure(api_key=self.api_key, transport="rest")
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @timed("gemini", "generate_content")
+    def generate(self, prompt: str) -> str:
+        response = self._get_model().generate_content(prompt, request_options={"timeout": self.timeout})
+        return response.text.strip()
+
+
+class FakeDescriptionClient(DescriptionClient):
+    """Offline stand-in returning a canned sentence after an optional delay."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return "Campus forecast generated offline."
+
+
+def description_key(likelihood: float, temperature: float, precipitation: float) -> DescriptionKey:
+    """Quantise the inputs so near-identical forecasts share one description."""
+    return (
+        int(round(float(likelihood) / LIKELIHOOD_BUCKET)),
+        int(float(temperature) // TEMPERATURE_BUCKET),
+        float(precipitation) >= RAIN_THRESHOLD_MM,
+    )
+
+
+def template_description(key: DescriptionKey) -> str:
+    likelihood_bucket, _, rainy = key
+    likelihood = likelihood_bucket * LIKELIHOOD_BUCKET
+    if likelihood > 0.7:
+        sentence = "Campus is set to be busy, so it's a great time to show up!"
+    elif likelihood < 0.4:
+        sentence = "It might be quiet on campus, so why not be one of the few?"
+    else:
+        sentence = "A steady turnout is expected on campus today."
+    if rainy:
+        sentence += " Bring an umbrella."
+    return sentence
+
+
+def build_prompt(key: DescriptionKey) -> str:
+    likelihood_bucket, temperature_bucket, rainy = key
+    return f"""
+Generate a short, engaging 1-sentence description for a student attendance forecast.
+The predicted attendance likelihood is {likelihood_bucket * LIKELIHOOD_BUCKET:.2f} (0-1 scale).
+The weather is around {temperature_bucket * TEMPERATURE_BUCKET + TEMPERATURE_BUCKET / 2:.0f}°C{" with rain" if rainy else " and dry"}.
+If likelihood is high (>0.7), be encouraging about the busy campus.
+If likelihood is low (<0.4), mention it might be quiet.
+If rain is high, mention bringing an umbrella.
+Keep it under 20 words.
+    """
+
+
+class DescriptionService:
+    """Serves forecast descriptions from a cache, generating misses in the background.
+
+    A miss queues one LLM call per key and returns the template straight
+    away (or after waiting up to `wait_seconds`), so a slow or failing LLM
+    never holds up the request.
+    """
+
+    def __init__(self, client: Optional[DescriptionClient], wait_seconds: float = DESCRIPTION_WAIT_SECONDS):
+        self.client = client
+        self.wait_seconds = wait_seconds
+        self.cache = TTLCache(maxsize=1024, ttl=DESCRIPTION_CACHE_TTL_SECONDS)
+        self._pending: Dict[DescriptionKey, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=DESCRIPTION_WORKERS, thread_name_prefix="descriptions")
+
+    def _generate(self, key: DescriptionKey) -> str:
+        try:
+            description = self.client.generate(build_prompt(key))
+            self.cache.set(key, description)
+        except Exception as e:
+            log_error("gemini_generate_failed", e)
+            description = template_description(key)
+            # Remember the failure briefly so an outage doesn't trigger a call per request
+            self.cache.set(key, description, ttl=DESCRIPTION_FAILURE_TTL_SECONDS)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        return description
+
+    def describe(self, likelihood: float, temperature: float, precipitation: float) -> Tuple[str, bool]:
+        """The description for these conditions, and whether it is final.
+
+        A template standing in for a pending or failed LLM call is not final,
+        so callers shouldn't let it be cached for long.
+        """
+        key = description_key(likelihood, temperature, precipitation)
+        if self.client is None:
+            return template_description(key), True
+        description = self.cache.get(key)
+        if description is None:
+            description = self._wait_for(key)
+        return description, description != template_description(key)
+
+    def _wait_for(self, key: DescriptionKey) -> str:
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._generate, key)
+                self._pending[key] = future
+
+        if self.wait_seconds > 0:
+            try:
+                return future.result(timeout=self.wait_seconds)
+            except TimeoutError:
+                pass
+        return template_description(key)
+
+
+def create_description_client() -> Optional[DescriptionClient]:
+    backend = os.environ.get("DESCRIPTION_BACKEND", "gemini").lower()
+    if backend == "fake":
+        return FakeDescriptionClient()
+    if backend == "template":
+        return None
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        # Set DESCRIPTION_BACKEND=template to run without Gemini on purpose
+        log_error("gemini_api_key_missing", "GEMINI_API_KEY not set", fallback="template")
+        return None
+    return GeminiDescriptionClient(api_key)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from metrics import log_error
+
+# "local" publishes from the worker that handled the check-in; "change_stream" tails Mongo so
+# every worker sees every check-in (requires a replica set)
+CHECKIN_FEED_SOURCE = os.environ.get("CHECKIN_FEED_SOURCE", "local").lower()
+SUBSCRIBER_QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+
+class CheckinBroker:
+    """In-process fan-out of check-in events to the subscribers of each module."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[queue.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, module_id: str) -> queue.Queue:
+        subscriber: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[module_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, module_id: str, subscriber: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers[module_id].discard(subscriber)
+            if not self._subscribers[module_id]:
+                del self._subscribers[module_id]
+
+    def publish(self, module_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(module_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client loses its oldest event rather than blocking the publisher
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    pass  # a concurrent publisher took the freed slot; never fail the caller's committed write
+
+    def subscriber_count(self, module_id: Optional[str] = None) -> int:
+        with self._lock:
+            if module_id is not None:
+                return len(self._subscribers.get(module_id, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None, event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def stream_events(broker: CheckinBroker, module_id: str, initial: Iterator[Dict[str, Any]] = ()) -> Iterator[str]:
+    """Yield SSE frames: `initial` events, then live ones, with heartbeats so dead clients are noticed."""
+    subscriber = broker.subscribe(module_id)
+    try:
+        for event in initial:
+            yield format_sse(event, event="checkin", event_id=event.get("event_id"))
+        while True:
+            try:
+                event = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(event, event="checkin", event_id=event.get("event_id"))
+    finally:
+        broker.unsubscribe(module_id, subscriber)
+
+
+class ChangeStreamPublisher:
+    """Tails inserts into lecture_attendances and publishes them to a broker.
+
+    `to_event` turns an attendance document into the event payload (it is
+    where usernames get resolved).
+    """
+
+    def __init__(self, collection: Collection, broker: CheckinBroker, to_event: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]):
+        self.collection = collection
+        self.broker = broker
+        self.to_event = to_event
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        resume_token = None
+        while not self._stop.is_set():
+            try:
+                with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}],
+                    resume_after=resume_token,
+                    max_await_time_ms=1000,
+                ) as change_stream:
+                    while not self._stop.is_set():
+                        change = change_stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = change_stream.resume_token
+                        doc = change["fullDocument"]
+                        event = self.to_event(doc)
+                        if event is not None:
+                            self.broker.publish(doc["module_id"], event)
+            except PyMongoError as e:
+                log_error("checkin_change_stream_failed", e)
+                self._stop.wait(5)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="checkin-change-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,105 @@
+"""Hour-keyed table of predictions over the whole forecast horizon.
+
+Predictions only change when the weather frame is refreshed or a
+different model is loaded, so PredictionService scores every hour of the
+horizon in one predict_batch call and then serves /predict and
+/predict/range from a dict. Each table remembers the frame and model it
+was built from and is rebuilt on the first lookup after either changes.
+"""
+from __future__ import annotations
+
+import bisect
+import datetime
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Entry = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class PredictionTable:
+    frame: Any  # the weather DataFrame the table was scored from
+    model: Any
+    hours: List[datetime.datetime]  # sorted
+    entries: Dict[datetime.datetime, Entry]
+
+
+def next_hour(when: datetime.datetime) -> datetime.datetime:
+    return when.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+
+
+class PredictionService:
+    def __init__(self, weather_frame: Callable[[], Any]):
+        self.weather_frame = weather_frame
+        self._tables: Dict[Optional[str], PredictionTable] = {}
+        self._lock = threading.Lock()
+
+    def _current_model(self, location: Optional[str]):
+        import predictor
+
+        return predictor.location_fit(location) if location is not None else predictor.get_model()
+
+    def _build(self, frame, model, location: Optional[str]) -> PredictionTable:
+        import pandas as pd
+        import predictor
+
+        features = pd.DataFrame({
+            "temperature": frame["temperature"],
+            "precipitation": frame["precipitation"],
+            "cloud_cover": frame["cloud_cover"],
+            "hour": frame.index.hour,
+            "dow": frame.index.dayofweek,
+        }, index=frame.index)
+        predictions = predictor.predict_batch(features, location=location) if len(features) else features
+
+        model_info = {"y_min": model.y_min, "y_max": model.y_max}
+        if location is not None:
+            model_info = {"location": location, **model_info}
+
+        entries = {}
+        for timestamp, weather, prediction in zip(frame.index, frame.itertuples(index=False), predictions.itertuples(index=False)):
+            entries[timestamp.to_pydatetime()] = {
+                "prediction": {
+                    "predicted_incount": float(prediction.predicted_incount),
+                    "likelihood": float(prediction.likelihood),
+                    "model_info": model_info,
+                },
+                "weather": {
+                    "temperature": float(weather.temperature),
+                    "precipitation": float(weather.precipitation),
+                    "cloud_cover": float(weather.cloud_cover),
+                },
+            }
+        return PredictionTable(frame=frame, model=model, hours=sorted(entries), entries=entries)
+
+    def table(self, location: Optional[str] = None) -> PredictionTable:
+        """The current table, rebuilt first if the weather or the model changed; ValueError for an unknown location."""
+        frame = self.weather_frame()
+        model = self._current_model(location)
+        table = self._tables.get(location)
+        if table is None or table.frame is not frame or table.model is not model:
+            with self._lock:
+                table = self._tables.get(location)
+                if table is None or table.frame is not frame or table.model is not model:
+                    table = self._tables[location] = self._build(frame, model, location)
+        return table
+
+    def at(self, when: datetime.datetime, location: Optional[str] = None) -> Optional[Entry]:
+        """The entry for the hour containing `when`, or the nearest forecast hour outside the horizon."""
+        table = self.table(location)
+        if not table.hours:
+            return None
+        hour = when.replace(minute=0, second=0, microsecond=0)
+        entry = table.entries.get(hour)
+        if entry is None:
+            entry = table.entries[min(table.hours, key=lambda h: abs(h - hour))]
+        return entry
+
+    def between(
+        self, start: Optional[datetime.datetime], end: Optional[datetime.datetime], location: Optional[str] = None
+    ) -> List[Tuple[datetime.datetime, Entry]]:
+        table = self.table(location)
+        lo = bisect.bisect_left(table.hours, start) if start is not None else 0
+        hi = bisect.bisect_right(table.hours, end) if end is not None else len(table.hours)
+        return [(hour, table.entries[hour]) for hour in table.hours[lo:hi]]
@@ -0,0 +1,51 @@
+"""gunicorn settings: `gunicorn -c gunicorn.conf.py app:app` from backend/.
+
+WORKER_CLASS=gevent (the default) serves each request on a greenlet, so
+handlers waiting on Mongo, GCS, Open-Meteo or Gemini yield to other requests
+instead of pinning a thread; PyMongo, requests and the GCS client all become
+cooperative through gevent's monkey-patching, and Gemini is called over its
+REST transport for the same reason (gRPC is not patched). WORKER_CLASS=gthread
+is the plain thread-per-request mode.
+
+With more than one worker the live check-in feed defaults to the Mongo change
+stream, since a "local" feed only reaches subscribers on the worker that
+handled the check-in, and each worker's /metrics is summed with the others'
+through METRICS_MULTIPROC_DIR.
+
+Behind a load balancer or reverse proxy, set TRUSTED_PROXY_HOPS to the
+number of proxies so client addresses (and the per-IP login limit) come
+from X-Forwarded-For; it defaults to 0, ignoring that header.
+"""
+import glob
+import os
+import tempfile
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+worker_class = os.environ.get("WORKER_CLASS", "gevent")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+if workers > 1:
+    # Read by feed.py and metrics.py in each worker, which inherits the master's environment
+    os.environ.setdefault("CHECKIN_FEED_SOURCE", "change_stream")
+    os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"bepresent-metrics-{os.getpid()}"))
+# gthread: requests in flight per worker
+threads = int(os.environ.get("WORKER_THREADS", "8"))
+# gevent: requests in flight per worker (SSE subscribers included)
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", "1000"))
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+accesslog = os.environ.get("ACCESS_LOG")
+
+
+def on_starting(server):
+    # Snapshots left by a previous run of the server would otherwise be added to this one's totals
+    directory = os.environ.get("METRICS_MULTIPROC_DIR")
+    if directory:
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.unlink(path)
+
+
+def when_ready(server):
+    if workers > 1 and os.environ.get("CHECKIN_FEED_SOURCE", "").lower() == "local":
+        server.log.warning(
+            "CHECKIN_FEED_SOURCE=local with %d workers: live feed subscribers only see check-ins "
+            "handled by their own worker", workers,
+        )
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional
+from urllib.parse import quote, urlencode
+
+from metrics import timed
+
+GCP_IMAGES_BUCKET_NAME = os.environ.get("GCP_IMAGES_BUCKET_NAME", "bepresentimages")
+GCP_CREDENTIALS_FILE_PATH = os.environ.get("GCP_CREDENTIALS_FILE_PATH", "gcp-credentials.json")
+GCS_HTTP_POOL_SIZE = int(os.environ.get("GCS_HTTP_POOL_SIZE", "32"))
+GCS_STREAM_CHUNK_SIZE = 256 * 1024
+# Where LocalImageStorage's signed URLs point: the API's own PUT /images/local_upload/<name>
+LOCAL_UPLOAD_BASE_URL = os.environ.get("LOCAL_UPLOAD_BASE_URL", "http://127.0.0.1:5000/api/v1/images/local_upload")
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    name: str
+    content_type: str
+    size: int
+    generation: str  # changes whenever the object is rewritten
+    updated: datetime.datetime
+
+
+@dataclass(frozen=True)
+class SignedUpload:
+    """A short-lived URL the client PUTs the object to, sending exactly `headers`."""
+
+    url: str
+    method: str
+    headers: Dict[str, str]
+    expires_at: datetime.datetime
+
+
+class ImageStorage:
+    """Minimal blob interface the image endpoints are written against."""
+
+    def stat(self, name: str) -> Optional[StoredImage]:
+        raise NotImplementedError
+
+    def exists(self, name: str) -> bool:
+        return self.stat(name) is not None
+
+    def existing(self, names: Iterable[str]) -> set[str]:
+        """The subset of `names` that exist."""
+        return {name for name in names if self.exists(name)}
+
+    def read(self, name: str) -> bytes:
+        raise NotImplementedError
+
+    def open(self, name: str, generation: Optional[str] = None) -> BinaryIO:
+        """Return a seekable binary stream over the object, pinned to `generation` where supported."""
+        raise NotImplementedError
+
+    def upload(self, name: str, file: BinaryIO, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def signed_upload(self, name: str, content_type: str, max_bytes: int, expires_in: datetime.timedelta) -> SignedUpload:
+        """Sign a PUT of at most `max_bytes` of `content_type` to `name`, so the bytes skip the API."""
+        raise NotImplementedError
+
+
+class GCSImageStorage(ImageStorage):
+    """Bucket-backed storage sharing one authorised HTTP session across requests.
+
+    The client is built on first use so importing the module never touches the
+    credentials file or the network.
+    """
+
+    def __init__(self, bucket_name: str, credentials_path: str, pool_size: int = GCS_HTTP_POOL_SIZE):
+        self.bucket_name = bucket_name
+        self.credentials_path = credentials_path
+        self.pool_size = pool_size
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    def _get_bucket(self):
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    from google.auth.transport.requests import AuthorizedSession
+                    from google.cloud import storage
+                    from google.oauth2 import service_account
+                    from requests.adapters import HTTPAdapter
+
+                    credentials = service_account.Credentials.from_service_account_file(
+                        self.credentials_path,
+                        scopes=["https://www.googleapis.com/auth/devstorage.read_write"],
+                    )
+                    # AuthorizedSession refreshes and reuses the access token; the adapter
+                    # keeps a pool of keep-alive connections large enough for every worker thread.
+                    session = AuthorizedSession(credentials)
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+
+                    client = storage.Client(project=credentials.project_id, credentials=credentials, _http=session)
+                    self._bucket = client.bucket(self.bucket_name)
+        return self._bucket
+
+    @timed("gcs", "stat")
+    def stat(self, name: str) -> Optional[StoredImage]:
+        blob = self._get_bucket().get_blob(name)
+        if blob is None:
+            return None
+        return StoredImage(
+            name=name,
+            content_type=blob.content_type or "application/octet-stream",
+            size=blob.size or 0,
+            generation=str(blob.generation),
+            updated=blob.updated,
+        )
+
+    def existing(self, names: Iterable[str]) -> set[str]:
+        # Metadata lookups are latency-bound, so overlap them on the shared connection pool
+        names = list(dict.fromkeys(names))
+        with ThreadPoolExecutor(max_workers=min(len(names), self.pool_size) or 1) as executor:
+            found = executor.map(self.exists, names)
+            return {name for name, exists in zip(names, found) if exists}
+
+    @timed("gcs", "read")
+    def read(self, name: str) -> bytes:
+        return self._get_bucket().blob(name).download_as_bytes()
+
+    @timed("gcs", "open")
+    def open(self, name: str, generation: Optional[str] = None) -> BinaryIO:
+        blob = self._get_bucket().blob(name, generation=int(generation) if generation else None)
+        return blob.open("rb", chunk_size=GCS_STREAM_CHUNK_SIZE)
+
+    @timed("gcs", "upload")
+    def upload(self, name: str, file: BinaryIO, content_type: Optional[str] = None) -> None:
+        self._get_bucket().blob(name).upload_from_file(file, content_type=content_type)
+
+    @timed("gcs", "sign")
+    def signed_upload(self, name: str, content_type: str, max_bytes: int, expires_in: datetime.timedelta) -> SignedUpload:
+        # Signed locally with the service account key, so this makes no network call
+        headers = {"Content-Type": content_type, "x-goog-content-length-range": f"0,{max_bytes}"}
+        url = self._get_bucket().blob(name).generate_signed_url(
+            version="v4", expiration=expires_in, method="PUT", content_type=content_type,
+            headers={"x-goog-content-length-range": headers["x-goog-content-length-range"]},
+        )
+        return SignedUpload(
+            url=url, method="PUT", headers=headers,
+            expires_at=datetime.datetime.now(datetime.timezone.utc) + expires_in,
+        )
+
+
+class LocalImageStorage(ImageStorage):
+    """Filesystem-backed storage for offline development, tests and benchmarks.
+
+    Each object is stored as `<root>/<name>` with its content type in a
+    `<name>.meta.json` sidecar. Signed uploads are HMAC-signed URLs to
+    `upload_base_url`, which the API serves itself in place of the bucket.
+    """
+
+    def __init__(self, root: str, signing_key: str = "", upload_base_url: str = LOCAL_UPLOAD_BASE_URL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.signing_key = signing_key.encode()
+        self.upload_base_url = upload_base_url.rstrip("/")
+
+    def _path(self, name: str) -> Path:
+        path = (self.root / name).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid image name: {name}")
+        return path
+
+    def _meta_path(self, name: str) -> Path:
+        path = self._path(name)
+        return path.with_name(path.name + ".meta.json")
+
+    def stat(self, name: str) -> Optional[StoredImage]:
+        path = self._path(name)
+        if not path.is_file():
+            return None
+        content_type = "application/octet-stream"
+        meta_path = self._meta_path(name)
+        if meta_path.is_file():
+            content_type = json.loads(meta_path.read_text()).get("content_type") or content_type
+        st = path.stat()
+        return StoredImage(
+            name=name,
+            content_type=content_type,
+            size=st.st_size,
+            generation=str(st.st_mtime_ns),
+            updated=datetime.datetime.fromtimestamp(st.st_mtime, tz=datetime.timezone.utc),
+        )
+
+    def read(self, name: str) -> bytes:
+        return self._path(name).read_bytes()
+
+    def open(self, name: str, generation: Optional[str] = None) -> BinaryIO:
+        return open(self._path(name), "rb")
+
+    def upload(self, name: str, file: BinaryIO, content_type: Optional[str] = None) -> None:
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as out:
+            shutil.copyfileobj(file, out)
+        self._meta_path(name).write_text(json.dumps({"content_type": content_type}))
+        os.replace(tmp_path, path)
+
+    def _signature(self, name: str, content_type: str, max_bytes: int, expires: int) -> str:
+        message = f"PUT\n{name}\n{content_type}\n{max_bytes}\n{expires}".encode()
+        return hmac.new(self.signing_key, message, hashlib.sha256).hexdigest()
+
+    def signed_upload(self, name: str, content_type: str, max_bytes: int, expires_in: datetime.timedelta) -> SignedUpload:
+        self._path(name)  # reject names outside the root before handing out a URL
+        expires = int(time.time() + expires_in.total_seconds())
+        query = urlencode({"expires": expires, "max_bytes": max_bytes, "signature": self._signature(name, content_type, max_bytes, expires)})
+        return SignedUpload(
+            url=f"{self.upload_base_url}/{quote(name)}?{query}",
+            method="PUT",
+            headers={"Content-Type": content_type},
+            expires_at=datetime.datetime.fromtimestamp(expires, tz=datetime.timezone.utc),
+        )
+
+    def verify_upload(self, name: str, content_type: str, max_bytes: int, expires: int, signature: str) -> bool:
+        """Check a PUT against a URL from signed_upload, the way the bucket would."""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(name, content_type, max_bytes, expires), signature)
+
+
+_STORAGE: Optional[ImageStorage] = None
+_STORAGE_LOCK = threading.Lock()
+
+
+def create_image_storage() -> ImageStorage:
+    backend = os.environ.get("IMAGE_STORAGE_BACKEND", "gcs").lower()
+    if backend == "local":
+        return LocalImageStorage(
+            os.environ.get("LOCAL_IMAGE_STORAGE_DIR", "local_images"),
+            signing_key=os.environ.get("SECRET_KEY", "dev_secret_key"),
+        )
+    if backend == "gcs":
+        return GCSImageStorage(GCP_IMAGES_BUCKET_NAME, GCP_CREDENTIALS_FILE_PATH)
+    raise ValueError(f"Unknown IMAGE_STORAGE_BACKEND: {backend}")
+
+
+def get_image_storage() -> ImageStorage:
+    global _STORAGE
+    if _STORAGE is None:
+        with _STORAGE_LOCK:
+            if _STORAGE is None:
+                _STORAGE = create_image_storage()
+    return _STORAGE
+
+
+def set_image_storage(storage: Optional[ImageStorage]) -> None:
+    """Swap the process-wide backend, e.g. for a LocalImageStorage in benchmarks."""
+    global _STORAGE
+    with _STORAGE_LOCK:
+        _STORAGE = storage
@@ -0,0 +1,121 @@
+"""Per-location footfall model with an hour-of-week profile, fitted from sufficient statistics.
+
+Each location's model is linear in a one-hot hour of the week (168 slots)
+plus temperature, precipitation and cloud cover. Training keeps only XᵀX
+and Xᵀy (and a few moments of y) per location. They are additive, so a
+new weekly CSV is folded in with `LocationStats.add` and the
+coefficients are re-solved in closed form with no refit over history.
+Hour-of-week slots are ridge-shrunk towards the location's mean. Slots
+seen once or never then borrow strength from the rest of the week.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from atomic_files import atomic_write
+
+HOURS_PER_WEEK = 7 * 24
+WEATHER_FEATURES = ("temperature", "precipitation", "cloud_cover")
+# intercept, one column per hour of the week, then the weather features
+N_FEATURES = 1 + HOURS_PER_WEEK + len(WEATHER_FEATURES)
+HOUR_OF_WEEK_RIDGE = float(os.environ.get("HOUR_OF_WEEK_RIDGE", "0.1"))
+
+
+def hour_of_week(hours: np.ndarray) -> np.ndarray:
+    """0 for Monday 00:00 ... 167 for Sunday 23:00, from datetime64 hours."""
+    hours = hours.astype("datetime64[h]")
+    days = hours.astype("datetime64[D]")
+    dow = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    return dow * 24 + (hours - days).astype(np.int64)
+
+
+def design_matrix(how: np.ndarray, temperature: np.ndarray, precipitation: np.ndarray, cloud_cover: np.ndarray) -> np.ndarray:
+    how = np.asarray(how, dtype=np.int64)
+    X = np.zeros((len(how), N_FEATURES))
+    X[:, 0] = 1.0
+    X[np.arange(len(how)), 1 + how] = 1.0
+    X[:, 1 + HOURS_PER_WEEK:] = np.column_stack([temperature, precipitation, cloud_cover])
+    return X
+
+
+@dataclass
+class LocationStats:
+    xtx: np.ndarray = field(default_factory=lambda: np.zeros((N_FEATURES, N_FEATURES)))
+    xty: np.ndarray = field(default_factory=lambda: np.zeros(N_FEATURES))
+    n: int = 0
+    y_sum: float = 0.0
+    y_sq_sum: float = 0.0
+    y_min: float = np.inf
+    y_max: float = -np.inf
+
+    def add(self, X: np.ndarray, y: np.ndarray) -> None:
+        if not len(y):
+            return
+        self.xtx += X.T @ X
+        self.xty += X.T @ y
+        self.n += len(y)
+        self.y_sum += float(y.sum())
+        self.y_sq_sum += float(y @ y)
+        self.y_min = min(self.y_min, float(y.min()))
+        self.y_max = max(self.y_max, float(y.max()))
+
+
+def accumulate(stats: Dict[str, LocationStats], locations: np.ndarray, X: np.ndarray, y: np.ndarray) -> None:
+    """Fold rows into `stats` (keyed by location name), dropping rows with missing values."""
+    keep = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+    locations, X, y = locations[keep], X[keep], y[keep]
+    for location in np.unique(locations):
+        rows = locations == location
+        stats.setdefault(str(location), LocationStats()).add(X[rows], y[rows])
+
+
+def save_stats(path: Path, stats: Dict[str, LocationStats]) -> None:
+    names = sorted(stats)
+    with atomic_write(path) as file:
+        np.savez(
+            file,
+            names=np.array(names, dtype=str),
+            xtx=np.array([stats[name].xtx for name in names]).reshape(len(names), N_FEATURES, N_FEATURES),
+            xty=np.array([stats[name].xty for name in names]).reshape(len(names), N_FEATURES),
+            moments=np.array([
+                [stats[name].n, stats[name].y_sum, stats[name].y_sq_sum, stats[name].y_min, stats[name].y_max]
+                for name in names
+            ]).reshape(len(names), 5),
+        )
+
+
+def load_stats(path: Path) -> Dict[str, LocationStats]:
+    with np.load(path) as data:
+        return {
+            str(name): LocationStats(xtx, xty, int(moments[0]), *map(float, moments[1:]))
+            for name, xtx, xty, moments in zip(data["names"], data["xtx"], data["xty"], data["moments"])
+        }
+
+
+@dataclass(frozen=True)
+class LocationFit:
+    beta: np.ndarray
+    y_min: float
+    y_max: float
+    y_mean: float
+    y_std: float
+
+
+def fit(stats: LocationStats, ridge: float = HOUR_OF_WEEK_RIDGE) -> LocationFit:
+    penalty = np.zeros(N_FEATURES)
+    penalty[1:1 + HOURS_PER_WEEK] = ridge
+    penalty[1 + HOURS_PER_WEEK:] = 1e-6  # keeps the weather columns solvable when a location saw no variation
+    beta = np.linalg.solve(stats.xtx + np.diag(penalty), stats.xty)
+
+    y_mean = stats.y_sum / stats.n
+    y_var = max(stats.y_sq_sum / stats.n - y_mean ** 2, 0.0)
+    return LocationFit(beta=beta, y_min=stats.y_min, y_max=stats.y_max, y_mean=y_mean, y_std=float(np.sqrt(y_var)) or 1.0)
+
+
+def fit_all(stats: Dict[str, LocationStats]) -> Dict[str, LocationFit]:
+    return {location: fit(location_stats) for location, location_stats in stats.items() if location_stats.n}
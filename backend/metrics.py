@@ -0,0 +1,336 @@
+"""Request timing, Mongo command counts and dependency latency, exposed in Prometheus text format.
+
+`install(blueprint)` times every request on the blueprint, `timed()` wraps
+calls to GCS, Gemini, Open-Meteo and the predictor, and
+MongoCommandListener is registered on the MongoClient. Each request also
+emits one JSON log line with its Mongo and dependency breakdown, and with
+SLOW_REQUEST_PROFILE_SECONDS set, requests slower than that are dumped as
+cProfile stats to SLOW_REQUEST_PROFILE_DIR. Errors go out as JSON lines too,
+through `log_error`.
+
+The registries live in each process. With several gunicorn workers, set
+METRICS_MULTIPROC_DIR (gunicorn.conf.py does so whenever workers > 1): every
+worker then writes a snapshot of its metrics there every
+METRICS_FLUSH_SECONDS, and /metrics on any worker serves the sum over all
+snapshots, so scrapes see the whole server rather than whichever worker
+answered.
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import cProfile
+import datetime
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import Blueprint, g, request
+from pymongo import monitoring
+
+from atomic_files import atomic_write
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_LOG_ENABLED = os.environ.get("REQUEST_LOG", "1") != "0"
+# 0 disables the sampler; otherwise sampled requests slower than this many seconds are profiled
+SLOW_REQUEST_PROFILE_SECONDS = float(os.environ.get("SLOW_REQUEST_PROFILE_SECONDS", "0"))
+# Fraction of requests run under the profiler while the sampler is enabled
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get("SLOW_REQUEST_SAMPLE_RATE", "0.1"))
+SLOW_REQUEST_PROFILE_DIR = os.environ.get("SLOW_REQUEST_PROFILE_DIR", "profiles")
+# Shared by every worker of one server; unset for a single process
+METRICS_MULTIPROC_DIR = os.environ.get("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+
+_root_logger = logging.getLogger("bepresent")
+if not _root_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _root_logger.addHandler(_handler)
+    _root_logger.setLevel(logging.INFO)
+    _root_logger.propagate = False
+logger = logging.getLogger("bepresent.requests")
+error_logger = logging.getLogger("bepresent.errors")
+
+
+def log_error(event: str, error: Any, **fields: Any) -> None:
+    """Emit one JSON line for a handled error, e.g. log_error("gcs_read_failed", e, image_id=name)."""
+    error_logger.error(json.dumps({
+        "event": event,
+        "error_type": type(error).__name__ if isinstance(error, BaseException) else None,
+        "error": str(error),
+        **fields,
+    }, default=str))
+
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] += amount
+
+    def snapshot(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into: Dict[Labels, float], labels: Labels, value: float) -> None:
+        into[labels] = into.get(labels, 0.0) + value
+
+    def render(self, values: Optional[Dict[Labels, float]] = None) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted((self.snapshot() if values is None else values).items()):
+            yield f"{self.name}{_label_text(self.labelnames, labels)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[Labels, list]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._values.items()}
+
+    @staticmethod
+    def merge(into: Dict[Labels, list], labels: Labels, series: list) -> None:
+        existing = into.get(labels)
+        into[labels] = list(series) if existing is None else [a + b for a, b in zip(existing, series)]
+
+    def render(self, values: Optional[Dict[Labels, list]] = None) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted((self.snapshot() if values is None else values).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _label_text(self.labelnames, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, labels)} {series[-1]:.6f}"
+            yield f"{self.name}_count{_label_text(self.labelnames, labels)} {cumulative}"
+
+
+REQUEST_SECONDS = Histogram(
+    "bepresent_http_request_duration_seconds", "Time to produce a response (streamed bodies excluded).",
+    ("endpoint", "method", "status"),
+)
+REQUEST_MONGO_COMMANDS = Counter(
+    "bepresent_http_request_mongo_commands_total", "Mongo commands issued while handling requests.", ("endpoint",),
+)
+MONGO_COMMANDS = Counter("bepresent_mongo_commands_total", "Mongo commands by name and outcome.", ("command", "outcome"))
+DEPENDENCY_SECONDS = Histogram(
+    "bepresent_dependency_duration_seconds", "Latency of calls to Mongo, GCS, Gemini, Open-Meteo and the predictor.",
+    ("dependency", "operation"),
+)
+REGISTRY = (REQUEST_SECONDS, REQUEST_MONGO_COMMANDS, MONGO_COMMANDS, DEPENDENCY_SECONDS)
+
+
+class RequestStats:
+    def __init__(self):
+        self.mongo_commands = 0
+        self.dependency_seconds: Dict[str, float] = defaultdict(float)
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def _record_dependency(dependency: str, operation: str, seconds: float) -> None:
+    DEPENDENCY_SECONDS.observe((dependency, operation), seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.dependency_seconds[dependency] += seconds
+
+
+@contextmanager
+def timed(dependency: str, operation: str) -> Iterator[None]:
+    """Time a call to an external dependency; usable as a context manager or a decorator."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_dependency(dependency, operation, time.perf_counter() - start)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Counts and times every command; events fire on the thread that issued the command."""
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+
+    def succeeded(self, event):
+        MONGO_COMMANDS.inc((event.command_name, "ok"))
+        _record_dependency("mongo", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMANDS.inc((event.command_name, "error"))
+        _record_dependency("mongo", event.command_name, event.duration_micros / 1e6)
+
+
+_snapshot_path: Optional[Path] = None
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+
+
+def _flush() -> None:
+    """Write this process's metrics to its file in METRICS_MULTIPROC_DIR."""
+    global _snapshot_path
+    if _snapshot_path is None or not _snapshot_path.name.startswith(f"{os.getpid()}-"):
+        # The random suffix keeps a recycled pid from overwriting a dead worker's totals
+        _snapshot_path = Path(METRICS_MULTIPROC_DIR) / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+    snapshot = {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()] for metric in REGISTRY}
+    with atomic_write(_snapshot_path, "w") as file:
+        json.dump(snapshot, file)
+
+
+def _flush_forever() -> None:
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            _flush()
+        except OSError as e:
+            log_error("metrics_flush_failed", e)
+
+
+def _ensure_flusher() -> None:
+    """Start the snapshot writer once per process (after gunicorn has forked the worker)."""
+    global _flusher_pid
+    if METRICS_MULTIPROC_DIR and _flusher_pid != os.getpid():
+        with _flusher_lock:
+            if _flusher_pid != os.getpid():
+                Path(METRICS_MULTIPROC_DIR).mkdir(parents=True, exist_ok=True)
+                threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+                _flusher_pid = os.getpid()
+
+
+def _merged_snapshots() -> Dict[str, Dict[Labels, Any]]:
+    _ensure_flusher()
+    _flush()  # this worker's own file is current; the others are at most METRICS_FLUSH_SECONDS old
+    merged: Dict[str, Dict[Labels, Any]] = {metric.name: {} for metric in REGISTRY}
+    for path in Path(METRICS_MULTIPROC_DIR).glob("*.json"):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # a worker's file being replaced right now; it is picked up on the next scrape
+        for metric in REGISTRY:
+            for labels, value in snapshot.get(metric.name, []):
+                metric.merge(merged[metric.name], tuple(labels), value)
+    return merged
+
+
+def render() -> str:
+    """Prometheus text for this process, or for every worker when METRICS_MULTIPROC_DIR is set."""
+    merged = _merged_snapshots() if METRICS_MULTIPROC_DIR else {}
+    lines: List[str] = [line for metric in REGISTRY for line in metric.render(merged.get(metric.name))]
+    return "\n".join(lines) + "\n"
+
+
+def _dump_profile(profiler: cProfile.Profile, endpoint: str, elapsed: float) -> None:
+    try:
+        directory = Path(SLOW_REQUEST_PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", endpoint)
+        path = directory / f"{stamp}-{slug}-{elapsed * 1000:.0f}ms.prof"
+        profiler.dump_stats(path)
+    except OSError as e:
+        log_error("slow_request_profile_write_failed", e, endpoint=endpoint)
+
+
+def install(blueprint: Blueprint) -> None:
+    """Time, count and log every request handled by `blueprint`."""
+
+    @blueprint.before_request
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _current.set(RequestStats())
+        g.metrics_profiler = None
+        if SLOW_REQUEST_PROFILE_SECONDS > 0 and random.random() < SLOW_REQUEST_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.metrics_profiler = profiler
+            except ValueError:
+                pass  # another request on this interpreter is already being profiled
+
+    @blueprint.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    # Teardown runs even when the handler raised (after_request doesn't), so failures are counted too
+    @blueprint.teardown_request
+    def finish_request(exc):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+        _ensure_flusher()
+        stats = _current.get() or RequestStats()
+        _current.reset(g.pop("metrics_token"))
+        status = 500 if exc is not None else g.pop("metrics_status", 500)
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe((endpoint, request.method, str(status)), elapsed)
+        REQUEST_MONGO_COMMANDS.inc((endpoint,), stats.mongo_commands)
+
+        if profiler is not None and elapsed >= SLOW_REQUEST_PROFILE_SECONDS:
+            _dump_profile(profiler, endpoint, elapsed)
+        if REQUEST_LOG_ENABLED:
+            logger.info(json.dumps({
+                "event": "request",
+                "method": request.method,
+                "endpoint": endpoint,
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 2),
+                "mongo_commands": stats.mongo_commands,
+                **{f"{name}_ms": round(seconds * 1000, 2) for name, seconds in stats.dependency_seconds.items()},
+            }))
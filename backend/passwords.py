@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from concurrency import cooperative, native_thread_pool
+
+# Any method werkzeug accepts, e.g. "scrypt", "scrypt:65536:8:1" or "pbkdf2:sha256:1000000"
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+# 0 hashes on the request thread instead of in worker processes
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+# Hashes allowed queued or running at once before new requests are turned away
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "32"))
+PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS", "2"))
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated; callers should answer 503."""
+
+
+_EXECUTOR: Optional[Executor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_PENDING = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+def _get_executor() -> Executor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                if cooperative():
+                    # Under gevent a process pool's manager thread would be a greenlet; hashlib's
+                    # scrypt/pbkdf2 release the GIL, so native threads keep the hub free instead
+                    _EXECUTOR = native_thread_pool(PASSWORD_HASH_WORKERS, "passwords")
+                else:
+                    # spawn, not fork: the web process already runs background threads
+                    _EXECUTOR = ProcessPoolExecutor(
+                        max_workers=PASSWORD_HASH_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+    return _EXECUTOR
+
+
+def _run(fn, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+    if not _PENDING.acquire(timeout=PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS):
+        raise HashingBusy()
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _PENDING.release()
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return _run(check_password_hash, password_hash, password)
+
+
+def method_prefix(method: str) -> str:
+    """The method string werkzeug stores in front of a hash made with `method`, defaults filled in.
+
+    Mirrors werkzeug's own expansion (e.g. "scrypt" -> "scrypt:32768:8:1"), so
+    no hash has to be computed to learn it.
+    """
+    name, *args = method.split(":")
+    if name == "scrypt":
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Unsupported PASSWORD_HASH_METHOD: {method}")
+
+
+_METHOD_PREFIX = method_prefix(PASSWORD_HASH_METHOD)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if `password_hash` was made with a different method or cost than the current policy."""
+    return password_hash.split("$", 1)[0] != _METHOD_PREFIX
@@ -1,5 +1,11 @@
 from __future__ import annotations
 
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, Dict, Any
@@ -7,6 +13,11 @@ from typing import Optional, Dict, Any
 import numpy as np
 import pandas as pd
 
+from atomic_files import atomic_write
+from metrics import log_error
+import location_model
+import training_data
+
 
 @dataclass(frozen=True)
 class FootfallModel:
@@ -18,7 +29,13 @@ class FootfallModel:
     y_std: float
 
 
+# Bump whenever FootfallModel or the feature encoding changes shape
+ARTIFACT_VERSION = 1
+ARTIFACT_NAME = "footfall_model"
+
 _MODEL: Optional[FootfallModel] = None
+_MODEL_LOCK = threading.Lock()
+_LOCATION_MODELS: Optional[Dict[str, location_model.LocationFit]] = None
 
 
 def _project_root_dir() -> Path:
@@ -26,93 +43,169 @@ def _project_root_dir() -> Path:
     return Path(__file__).resolve().parent
 
 
-def train_model() -> FootfallModel:
+def _artifact_dir() -> Path:
+    return Path(os.environ.get("MODEL_ARTIFACT_DIR", _project_root_dir() / "artifacts"))
+
+
+def _dataset_files() -> list[Path]:
     base_dir = _project_root_dir()
+    return sorted((base_dir / "datasets" / "footfall").glob("*.csv")) + [base_dir / "datasets" / "weather" / "weather.csv"]
 
-    footfall_files = (base_dir / "datasets" / "footfall").glob("*.csv")
-    footfall_dfs = []
-    for file in footfall_files:
-        df = pd.read_csv(file)
-        footfall_dfs.append(df)
 
-    if not footfall_dfs:
-        raise FileNotFoundError("No footfall CSV files found in backend/datasets/footfall")
+def dataset_hash() -> str:
+    """Content hash of every CSV train_model reads, used to tell when an artifact is stale."""
+    digest = hashlib.sha256()
+    for file in _dataset_files():
+        digest.update(file.name.encode())
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
 
-    footfall = pd.concat(footfall_dfs, ignore_index=True)
 
-    footfall["datetime"] = pd.to_datetime(
-        footfall["Date"].astype(str) + " " + footfall["Hour"].astype(str),
-        format="%d-%b-%y %H:%M",
-        dayfirst=True,
-        errors="coerce",
-    )
-    footfall.drop(columns=["Date", "Hour"], inplace=True)
-
-    weather_file = base_dir / "datasets" / "weather" / "weather.csv"
-    weather = pd.read_csv(weather_file, skiprows=2)
-    weather["datetime"] = pd.to_datetime(weather["time"])
-    weather.drop(columns=["time"], inplace=True)
-
-    data = footfall.merge(weather, on="datetime", how="inner", validate="many_to_one")
-
-    hourly = (
-        data.groupby("datetime", as_index=False)
-        .agg(
-            InCount=("InCount", "sum"),
-            OutCount=("OutCount", "sum"),
-            temperature=("temperature_2m (°C)", "mean"),
-            precipitation=("precipitation (mm)", "mean"),
-            cloud_cover=("cloud_cover (%)", "mean"),
-        )
-        .sort_values("datetime")
-    )
-    hourly["hour"] = hourly["datetime"].dt.hour
-    hourly["dow"] = hourly["datetime"].dt.dayofweek  # Monday=0 ... Sunday=6
+def _training_store_dir() -> Path:
+    return _artifact_dir() / "training_data"
 
-    dow_encodings = pd.get_dummies(hourly["dow"], prefix="dow", drop_first=True)
 
-    X = pd.concat(
-        [
-            hourly[["temperature", "precipitation", "cloud_cover", "hour"]],
-            dow_encodings,
-        ],
-        axis=1,
-    ).astype(float)
+def ingest(store_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """Fold any new or changed dataset CSVs into the columnar training store."""
+    files = _dataset_files()
+    return training_data.update_store(store_dir or _training_store_dir(), files[:-1], files[-1])
 
-    y = hourly["InCount"].astype(float)
 
-    mask = X.notna().all(axis=1) & y.notna()
-    X = X.loc[mask]
-    y = y.loc[mask]
+def train_model(store_dir: Optional[Path] = None) -> FootfallModel:
+    store_dir = store_dir or _training_store_dir()
+    manifest = ingest(store_dir)
+    if not manifest["footfall_files"]:
+        raise FileNotFoundError("No footfall CSV files found in backend/datasets/footfall")
+    return fit_model(training_data.load_hourly(store_dir))
+
+
+def fit_model(hourly: training_data.HourlyData) -> FootfallModel:
+    """Fit the all-sites model (total footfall per hour) to joined hourly data."""
+    hour = (hourly.hour - hourly.hour.astype("datetime64[D]")).astype(int).astype(float)
+    dow = (hourly.hour.astype("datetime64[D]").astype(int) + 3) % 7  # Monday=0 ... Sunday=6; 1970-01-01 was a Thursday
+
+    # Same columns as pd.get_dummies(dow, prefix="dow", drop_first=True): one per weekday seen, bar the first
+    dow_columns = [f"dow_{d}" for d in np.unique(dow)[1:]]
+    X = np.column_stack(
+        [hourly.temperature, hourly.precipitation, hourly.cloud_cover, hour]
+        + [dow == int(column.removeprefix("dow_")) for column in dow_columns]
+    ).astype(float)
+    y = hourly.in_count.astype(float)
+
+    mask = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
+    X = X[mask]
+    y = y[mask]
 
     n = len(X)
     if n < 20:
         raise ValueError("Not enough data for training!")
 
     split_idx = int(0.8 * n)
-    X_train = X.iloc[:split_idx]
-    y_train = y.iloc[:split_idx]
+    X_train_i = np.c_[np.ones(split_idx), X[:split_idx]]
+    beta, *_ = np.linalg.lstsq(X_train_i, y[:split_idx], rcond=None)
 
-    X_train_i = np.c_[np.ones(len(X_train)), X_train.to_numpy()]
-    beta, *_ = np.linalg.lstsq(X_train_i, y_train.to_numpy(), rcond=None)
-
-    y_np = y.to_numpy()
-    y_std = float(np.std(y_np)) if float(np.std(y_np)) != 0.0 else 1.0
+    y_std = float(np.std(y)) if float(np.std(y)) != 0.0 else 1.0
 
     return FootfallModel(
         beta=beta,
-        feature_columns=X.columns.tolist(),
-        y_min=float(np.min(y_np)),
-        y_max=float(np.max(y_np)),
-        y_mean=float(np.mean(y_np)),
+        feature_columns=["temperature", "precipitation", "cloud_cover", "hour"] + dow_columns,
+        y_min=float(np.min(y)),
+        y_max=float(np.max(y)),
+        y_mean=float(np.mean(y)),
         y_std=y_std,
     )
 
 
+def save_model(model: FootfallModel, data_hash: str, artifact_dir: Optional[Path] = None) -> Path:
+    """Write `model` as <name>.npz (coefficients) plus a <name>.json manifest."""
+    artifact_dir = artifact_dir or _artifact_dir()
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+
+    with atomic_write(artifact_dir / f"{ARTIFACT_NAME}.npz") as file:
+        # The hash is repeated here so load_model can tell whether this npz belongs to the manifest
+        np.savez(file, beta=model.beta, dataset_hash=np.array(data_hash))
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "dataset_hash": data_hash,
+        "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "feature_columns": model.feature_columns,
+        "y_min": model.y_min,
+        "y_max": model.y_max,
+        "y_mean": model.y_mean,
+        "y_std": model.y_std,
+    }
+    manifest_path = artifact_dir / f"{ARTIFACT_NAME}.json"
+    with atomic_write(manifest_path, "w") as file:
+        file.write(json.dumps(manifest, indent=2))
+    return manifest_path
+
+
+def load_model(data_hash: Optional[str] = None, artifact_dir: Optional[Path] = None) -> Optional[FootfallModel]:
+    """Load the saved artifact, or None if it is missing, from another version or trained on other data."""
+    artifact_dir = artifact_dir or _artifact_dir()
+    manifest_path = artifact_dir / f"{ARTIFACT_NAME}.json"
+    weights_path = artifact_dir / f"{ARTIFACT_NAME}.npz"
+    if not manifest_path.is_file() or not weights_path.is_file():
+        return None
+
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("version") != ARTIFACT_VERSION:
+        return None
+    if data_hash is not None and manifest.get("dataset_hash") != data_hash:
+        return None
+
+    with np.load(weights_path) as weights:
+        # Another writer may have replaced the npz but not yet the manifest; treat that as a miss
+        if "dataset_hash" not in weights or str(weights["dataset_hash"]) != manifest.get("dataset_hash"):
+            return None
+        beta = weights["beta"]
+
+    return FootfallModel(
+        beta=beta,
+        feature_columns=list(manifest["feature_columns"]),
+        y_min=float(manifest["y_min"]),
+        y_max=float(manifest["y_max"]),
+        y_mean=float(manifest["y_mean"]),
+        y_std=float(manifest["y_std"]),
+    )
+
+
+def load_or_train_model() -> FootfallModel:
+    data_hash = dataset_hash()
+    model = load_model(data_hash)
+    if model is not None:
+        return model
+
+    model = train_model()
+    try:
+        save_model(model, data_hash)
+    except OSError as e:
+        log_error("model_artifact_save_failed", e)
+    return model
+
+
+def get_location_models() -> Dict[str, location_model.LocationFit]:
+    """Per-location models solved from the training store's sufficient statistics (cheap, so never persisted)."""
+    global _LOCATION_MODELS
+    if _LOCATION_MODELS is None:
+        with _MODEL_LOCK:
+            if _LOCATION_MODELS is None:
+                store_dir = _training_store_dir()
+                ingest(store_dir)
+                _LOCATION_MODELS = location_model.fit_all(training_data.load_location_stats(store_dir))
+    return _LOCATION_MODELS
+
+
+def locations() -> list[str]:
+    return sorted(get_location_models())
+
+
 def get_model() -> FootfallModel:
     global _MODEL
     if _MODEL is None:
-        _MODEL = train_model()
+        with _MODEL_LOCK:
+            if _MODEL is None:
+                _MODEL = load_or_train_model()
     return _MODEL
 
 
@@ -140,13 +233,87 @@ def _build_feature_row(
     return row
 
 
+def _to_likelihood(model: FootfallModel | location_model.LocationFit, pred_incount: np.ndarray) -> np.ndarray:
+    # Convert predicted footfall into a 0..1 "likelihood" score.
+    # Prefer min-max scaling based on training distribution; fallback to z-score sigmoid if needed.
+    denom = (model.y_max - model.y_min)
+    if denom > 0:
+        likelihood = (pred_incount - model.y_min) / denom
+    else:
+        z = (pred_incount - model.y_mean) / model.y_std
+        likelihood = 1.0 / (1.0 + np.exp(-z))
+
+    return np.clip(likelihood, 0.0, 1.0)
+
+
+def _build_feature_matrix(model: FootfallModel, features: pd.DataFrame) -> np.ndarray:
+    """Vectorised counterpart of _build_feature_row: one row per input row, in model.feature_columns order."""
+    n = len(features)
+    dow = features["dow"].to_numpy(dtype=int)
+    X = np.zeros((n, len(model.feature_columns)), dtype=float)
+    for j, col in enumerate(model.feature_columns):
+        if col.startswith("dow_"):
+            X[:, j] = dow == int(col.removeprefix("dow_"))
+        elif col in features:
+            X[:, j] = features[col].to_numpy(dtype=float)
+    return X
+
+
+def location_fit(location: str) -> location_model.LocationFit:
+    fit = get_location_models().get(location)
+    if fit is None:
+        raise ValueError(f"Unknown location: {location}")
+    return fit
+
+
+def predict_batch(features: pd.DataFrame | Dict[str, Any], location: Optional[str] = None) -> pd.DataFrame:
+    """Score many rows at once with a single matrix multiply.
+
+    `features` is a DataFrame (or mapping of equal-length arrays) with
+    temperature, precipitation, cloud_cover, hour and dow columns. Returns a
+    DataFrame aligned with the input holding predicted_incount and likelihood,
+    for all sites or for `location`.
+    """
+    if not isinstance(features, pd.DataFrame):
+        features = pd.DataFrame(features)
+
+    missing = {"temperature", "precipitation", "cloud_cover", "hour", "dow"} - set(features.columns)
+    if missing:
+        raise ValueError(f"Missing feature columns: {sorted(missing)}")
+
+    if location is not None:
+        model = location_fit(location)
+        X = location_model.design_matrix(
+            features["dow"].to_numpy(dtype=int) * 24 + features["hour"].to_numpy(dtype=int),
+            *(features[name].to_numpy(dtype=float) for name in location_model.WEATHER_FEATURES),
+        )
+        pred_incount = X @ model.beta
+    else:
+        model = get_model()
+        X = _build_feature_matrix(model, features)
+        pred_incount = model.beta[0] + X @ model.beta[1:]
+
+    return pd.DataFrame(
+        {
+            "predicted_incount": pred_incount,
+            "likelihood": _to_likelihood(model, pred_incount),
+        },
+        index=features.index,
+    )
+
+
 def predict(
     temperature: float,
     precipitation: float,
     cloud_cover: float,
     hour: int,
     dow: int,
+    location: Optional[str] = None,
 ) -> Dict[str, Any]:
+    """Footfall for one hour: across all sites, or at `location` (a LocationName) when given."""
+    if location is not None:
+        return _predict_location(location, temperature, precipitation, cloud_cover, hour, dow)
+
     model = get_model()
 
     x = _build_feature_row(
@@ -159,17 +326,7 @@ def predict(
     )
     x_i = np.r_[1.0, x]  # intercept
     pred_incount = float(x_i @ model.beta)
-
-    # Convert predicted footfall into a 0..1 "likelihood" score.
-    # Prefer min-max scaling based on training distribution; fallback to z-score sigmoid if needed.
-    denom = (model.y_max - model.y_min)
-    if denom > 0:
-        likelihood = (pred_incount - model.y_min) / denom
-    else:
-        z = (pred_incount - model.y_mean) / model.y_std
-        likelihood = 1.0 / (1.0 + float(np.exp(-z)))
-
-    likelihood = float(np.clip(likelihood, 0.0, 1.0))
+    likelihood = float(_to_likelihood(model, np.array([pred_incount]))[0])
 
     return {
         "predicted_incount": pred_incount,
@@ -179,3 +336,44 @@ def predict(
             "y_max": model.y_max,
         },
     }
+
+
+def _predict_location(location: str, temperature: float, precipitation: float, cloud_cover: float, hour: int, dow: int) -> Dict[str, Any]:
+    fit = location_fit(location)
+    x = location_model.design_matrix(
+        np.array([int(dow) * 24 + int(hour)]), np.array([temperature]), np.array([precipitation]), np.array([cloud_cover])
+    )[0]
+    pred_incount = float(x @ fit.beta)
+    likelihood = float(_to_likelihood(fit, np.array([pred_incount]))[0])
+
+    return {
+        "predicted_incount": pred_incount,
+        "likelihood": likelihood,
+        "model_info": {
+            "location": location,
+            "y_min": fit.y_min,
+            "y_max": fit.y_max,
+        },
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Footfall model tooling")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train the model and write its artifact")
+    train_parser.add_argument("--artifact-dir", type=Path, default=None)
+    ingest_parser = subparsers.add_parser("ingest", help="Add new weekly CSVs to the columnar training store")
+    ingest_parser.add_argument("--store-dir", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        model = train_model()
+        manifest_path = save_model(model, dataset_hash(), args.artifact_dir)
+        print(f"Wrote {manifest_path} ({len(model.feature_columns)} features)")
+    elif args.command == "ingest":
+        manifest = ingest(args.store_dir)
+        print(f"Training store covers {len(manifest['footfall_files'])} footfall files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RateLimiter:
+    """In-process token bucket per key: `limit` attempts, refilled evenly over `window_seconds`.
+
+    At most `maxsize` keys are tracked; the least recently seen are dropped first.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, maxsize: int = 100_000):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.maxsize = maxsize
+        self._rate = limit / window_seconds
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: Hashable) -> tuple[bool, int]:
+        """Consume one attempt for `key`, returning (allowed, seconds until the next attempt is allowed)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(self.limit), now))
+            tokens = min(float(self.limit), tokens + (now - updated) * self._rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        retry_after = 0 if allowed else math.ceil((1.0 - tokens) / self._rate)
+        return allowed, retry_after
+
+    def reset(self, key: Hashable) -> None:
+        with self._lock:
+            self._buckets.pop(key, None)
@@ -0,0 +1,154 @@
+"""Weekly rollups of archived check-ins, so old history costs one document per week.
+
+lecture_attendances keeps raw rows only for a hot window (everything the
+check-in path reads: today's duplicates and classmates, the offline batch
+window). `python rollups.py archive` moves whole weeks older than that into
+attendance_rollups, one bucket per user, module and week:
+
+    {user_id, module_id, week_start, checkins: [{_id, date, image_id}]}
+
+Check-ins keep their original _id inside the bucket, so archiving is
+idempotent: a rerun after a crash between the upsert and the delete
+re-adds the same entries with $addToSet instead of double counting, and
+readers that merge both sources dedupe on _id. Readers get rows from
+`archived_checkins` in the same (date, _id) order as the raw collection.
+"""
+from __future__ import annotations
+
+import datetime
+import heapq
+import os
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+ROLLUPS_COLLECTION = "attendance_rollups"
+# Raw rows younger than this are never archived; must cover every read on the check-in path
+ATTENDANCE_HOT_DAYS = int(os.environ.get("ATTENDANCE_HOT_DAYS", "28"))
+ARCHIVE_BATCH_SIZE = 5000
+
+
+def week_start(when: datetime.datetime) -> datetime.datetime:
+    """Midnight on the Monday of `when`'s week."""
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def archive_cutoff(now: datetime.datetime, hot_days: int = ATTENDANCE_HOT_DAYS) -> datetime.datetime:
+    """Rows before this are archived; always a week boundary, so a bucket is written once."""
+    return week_start(now - datetime.timedelta(days=hot_days))
+
+
+def _checkin_row(bucket: Dict[str, Any], checkin: Dict[str, Any]) -> Dict[str, Any]:
+    return {"user_id": bucket["user_id"], "module_id": bucket["module_id"], **checkin}
+
+
+def _rows_by_week(buckets) -> Iterator[Dict[str, Any]]:
+    # Buckets arrive sorted by week; a week's modules interleave, so sort each week's rows before yielding
+    for _, week_buckets in groupby(buckets, key=lambda bucket: (bucket["user_id"], bucket["week_start"])):
+        rows = [_checkin_row(bucket, checkin) for bucket in week_buckets for checkin in bucket["checkins"]]
+        yield from sorted(rows, key=lambda row: (row["date"], row["_id"]))
+
+
+def archived_checkins(
+    db: Database,
+    user_id: str,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    after: Optional[tuple] = None,
+) -> Iterator[Dict[str, Any]]:
+    """A user's archived check-ins in [start, end] (and after the (date, _id) `after`), oldest first.
+
+    Buckets are read lazily, a week at a time, so a caller that stops after
+    one page never touches later weeks.
+    """
+    lower = start
+    if after is not None and (lower is None or after[0] > lower):
+        lower = after[0]
+    query: Dict[str, Any] = {"user_id": user_id}
+    week_filter = {}
+    if lower is not None:
+        week_filter["$gte"] = week_start(lower)
+    if end is not None:
+        week_filter["$lte"] = end
+    if week_filter:
+        query["week_start"] = week_filter
+
+    buckets = db[ROLLUPS_COLLECTION].find(query).sort([("week_start", 1), ("module_id", 1)])
+    for row in _rows_by_week(buckets):
+        if start is not None and row["date"] < start:
+            continue
+        if after is not None and (row["date"], row["_id"]) <= after:
+            continue
+        if end is not None and row["date"] > end:
+            return
+        yield row
+
+
+def merge_checkins(*sources: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Merge (date, _id)-ordered check-ins from raw rows and rollups, dropping any row present in both."""
+    seen = set()
+    for row in heapq.merge(*sources, key=lambda row: (row["date"], row["_id"])):
+        if row["_id"] not in seen:
+            seen.add(row["_id"])
+            yield row
+
+
+def all_archived_checkins(db: Database) -> Iterator[Dict[str, Any]]:
+    """Every archived check-in, ordered by (user_id, date), for counters.rebuild_counters."""
+    buckets = db[ROLLUPS_COLLECTION].find({}).sort([("user_id", 1), ("week_start", 1), ("module_id", 1)])
+    return _rows_by_week(buckets)
+
+
+def archive(db: Database, now: Optional[datetime.datetime] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Fold raw check-ins older than the hot window into weekly buckets; returns how many rows moved."""
+    cutoff = archive_cutoff(now or datetime.datetime.utcnow())
+    attendances = db["lecture_attendances"]
+    rollups = db[ROLLUPS_COLLECTION]
+    moved = 0
+
+    while True:
+        rows = list(
+            attendances.find({"date": {"$lt": cutoff}}, {"user_id": 1, "module_id": 1, "date": 1, "image_id": 1})
+            .sort("date", 1)
+            .limit(batch_size)
+        )
+        if not rows:
+            return moved
+
+        buckets: Dict[tuple, List[Dict[str, Any]]] = {}
+        for row in rows:
+            key = (row["user_id"], row["module_id"], week_start(row["date"]))
+            buckets.setdefault(key, []).append({"_id": row["_id"], "date": row["date"], "image_id": row.get("image_id")})
+
+        rollups.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "module_id": module_id, "week_start": week},
+                {"$addToSet": {"checkins": {"$each": checkins}}},
+                upsert=True,
+            )
+            for (user_id, module_id, week), checkins in buckets.items()
+        ], ordered=False)
+        # Only delete once every row is safely in its bucket
+        attendances.delete_many({"_id": {"$in": [row["_id"] for row in rows]}})
+        moved += len(rows)
+
+
+def main() -> None:
+    import argparse
+    import certifi
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Attendance archival")
+    parser.add_argument("command", choices=["archive"])
+    parser.parse_args()
+
+    client = MongoClient(os.environ["MONGODB_URI"], tls=True, tlsCAFile=certifi.where())
+    moved = archive(client["CoreSystem"])
+    print(f"Archived {moved} check-ins older than {ATTENDANCE_HOT_DAYS} days into weekly rollups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Process-wide clients behind the API, each created on first use.
+
+Nothing here connects, reads datasets or imports pandas until a handler
+(or the warm-up started by the first request) asks for it, so importing
+the app and building it with `create_app()` stay cheap.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+import certifi
+from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+import metrics
+
+_config: Dict[str, Any] = {}
+_lock = threading.Lock()
+_client: Optional[MongoClient] = None
+_db: Optional[Database] = None
+_weather_provider = None
+
+
+def configure(config: Mapping[str, Any]) -> None:
+    """Adopt `config` (an app.config) and drop any clients built from the previous one."""
+    global _config, _client, _db, _weather_provider
+    with _lock:
+        if _client is not None:
+            _client.close()
+        if _weather_provider is not None:
+            _weather_provider.stop()
+        _config = dict(config)
+        _client = _db = _weather_provider = None
+
+
+def get_db() -> Database:
+    global _client, _db
+    if _db is None:
+        with _lock:
+            if _db is None:
+                uri = _config.get("MONGODB_URI")
+                if not uri:
+                    raise RuntimeError("MONGODB_URI is not configured")
+                # MongoClient connects in the background, so this returns without waiting on the server
+                _client = MongoClient(
+                    uri, tls=True, tlsCAFile=certifi.where(),
+                    event_listeners=[metrics.MongoCommandListener()],
+                )
+                _db = _client[_config.get("MONGODB_DATABASE", "CoreSystem")]
+    return _db
+
+
+class LazyCollection:
+    """Stands in for `get_db()[name]` so module-level collection handles don't force a connection."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def resolve(self) -> Collection:
+        return get_db()[self.name]
+
+    def __getattr__(self, attr: str):
+        return getattr(self.resolve(), attr)
+
+
+def get_weather_provider():
+    """The forecast cache, started on first use; importing weather pulls in pandas."""
+    global _weather_provider
+    if _weather_provider is None:
+        with _lock:
+            if _weather_provider is None:
+                from weather import WeatherProvider
+
+                provider = WeatherProvider()
+                provider.start()
+                _weather_provider = provider
+    return _weather_provider
@@ -0,0 +1,46 @@
+"""Shared fixtures: the app booted once per session against the benchmark stand-ins."""
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("REQUEST_LOG", "0")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-long-enough-for-hs256-signing")
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    # Imported outright rather than importorskip'd: a missing dev dependency must fail, not skip the suite
+    from benchmarks.stand_ins import boot_app
+
+    return boot_app()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def db(app_module):
+    with app_module.app.app_context():
+        yield app_module.get_db()
+
+
+@pytest.fixture
+def make_user(app_module, db):
+    """Insert a user and return (user_id, Authorization headers)."""
+    counter = iter(range(1_000_000))
+
+    def make(prefix="student"):
+        username = f"{prefix}{next(counter)}-{os.urandom(4).hex()}"
+        user_id = str(db.users.insert_one({"username": username, "email": f"{username}@example.com"}).inserted_id)
+        with app_module.app.app_context():
+            token = app_module.generate_token(user_id, username)
+        return user_id, {"Authorization": f"Bearer {token}"}
+
+    return make
@@ -0,0 +1,49 @@
+"""Per-item validation in /log_attendance/batch: a malformed item is a 400 for that item, never a 500."""
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+
+@pytest.mark.parametrize("item", [
+    {"logged_at": 1760000000},
+    {"module_code": ["M1"]},
+    {"image_id": {"$ne": None}},
+    {"idempotency_key": 7},
+])
+def test_malformed_item_is_rejected_on_its_own(client, make_user, item):
+    _, headers = make_user()
+    good = {"idempotency_key": str(uuid.uuid4()), "module_code": "NOPE000", "image_id": str(uuid.uuid4())}
+    bad = {**good, "idempotency_key": str(uuid.uuid4()), **item}
+
+    response = client.post("/api/v1/log_attendance/batch", headers=headers, json={"items": [bad, good]})
+
+    assert response.status_code == 200
+    bad_result, good_result = response.get_json()["results"]
+    assert bad_result["status"] == 400
+    assert good_result["status"] == 404  # still validated normally: the module doesn't exist
+
+
+@pytest.mark.parametrize("error, status", [
+    ({"code": 11000, "errmsg": "E11000 duplicate key error index: user_idempotency_key_unique"}, 200),
+    ({"code": 121, "errmsg": "Document failed validation"}, 500),
+])
+def test_only_idempotency_conflicts_count_as_synced(app_module, client, db, make_user, monkeypatch, error, status):
+    from pymongo.errors import BulkWriteError
+
+    user_id, headers = make_user()
+    module_code = f"BW{uuid.uuid4().hex[:6]}"
+    module_id = str(db.modules.insert_one({"code": module_code}).inserted_id)
+    db.module_participants.insert_one({"user_id": user_id, "module_id": module_id})
+    image_id = str(uuid.uuid4())
+    db.images.insert_one({"_id": image_id, "user_id": user_id, "status": "ready"})
+
+    def insert_many(docs, ordered=True):
+        raise BulkWriteError({"writeErrors": [{"index": 0, **error}]})
+
+    monkeypatch.setattr(app_module.lecture_attendances_collection, "insert_many", insert_many, raising=False)
+    item = {"idempotency_key": str(uuid.uuid4()), "module_code": module_code, "image_id": image_id}
+    response = client.post("/api/v1/log_attendance/batch", headers=headers, json={"items": [item]})
+
+    assert response.get_json()["results"][0]["status"] == status
@@ -0,0 +1,26 @@
+"""attendance_stats keeps only the latest day and week, so the document never grows with history."""
+from __future__ import annotations
+
+import datetime
+import uuid
+
+from counters import ATTENDANCE_STATS_COLLECTION, record_attendance, summarise
+
+MONDAY = datetime.datetime(2024, 3, 4, 9)
+
+
+def test_only_the_latest_day_and_week_are_stored(db):
+    user_id = uuid.uuid4().hex
+    db[ATTENDANCE_STATS_COLLECTION].insert_one({"_id": user_id, "days": {"2023-01-02": 1}, "weeks": {"2023-W01": 1}})
+    for offset in (0, 0, 1, 7, 8, 8):
+        record_attendance(db, user_id, "m1", MONDAY + datetime.timedelta(days=offset))
+    # Synced late from the week before; counted in the total but can't rewind the current day or week
+    record_attendance(db, user_id, "m1", MONDAY + datetime.timedelta(days=2))
+
+    stats = db[ATTENDANCE_STATS_COLLECTION].find_one({"_id": user_id})
+    assert "days" not in stats and "weeks" not in stats
+    assert (stats["day"], stats["day_count"], stats["week"], stats["week_count"]) == ("2024-03-12", 2, "2024-W11", 3)
+
+    summary = summarise(stats, (MONDAY + datetime.timedelta(days=8)).date())
+    assert (summary["total"], summary["today"], summary["this_week"]) == (7, 2, 3)
+    assert summarise(stats, (MONDAY + datetime.timedelta(days=9)).date())["today"] == 0
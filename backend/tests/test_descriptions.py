@@ -0,0 +1,23 @@
+"""DescriptionService flags the template it serves while the LLM call is pending."""
+from __future__ import annotations
+
+import time
+
+from descriptions import DescriptionService, FakeDescriptionClient, description_key, template_description
+
+
+def test_template_is_provisional_until_generated():
+    service = DescriptionService(FakeDescriptionClient(latency=0.05))
+    template = template_description(description_key(0.8, 12.0, 0.0))
+
+    assert service.describe(0.8, 12.0, 0.0) == (template, False)
+    deadline = time.monotonic() + 5
+    while service.describe(0.8, 12.0, 0.0)[1] is False and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.describe(0.8, 12.0, 0.0) == ("Campus forecast generated offline.", True)
+
+
+def test_template_backend_is_final():
+    service = DescriptionService(None)
+
+    assert service.describe(0.2, 3.0, 1.0) == (template_description(description_key(0.2, 3.0, 1.0)), True)
@@ -0,0 +1,26 @@
+"""CheckinBroker.publish never raises, even when a concurrent publisher races it for a full queue's slot."""
+from __future__ import annotations
+
+import queue
+
+from feed import CheckinBroker
+
+
+class RacedQueue(queue.Queue):
+    """A full queue whose freed slot is taken by another publisher the moment it opens."""
+
+    def get_nowait(self):
+        item = super().get_nowait()
+        super().put_nowait({"from": "other publisher"})
+        return item
+
+
+def test_publish_to_full_queue_survives_a_racing_publisher():
+    broker = CheckinBroker()
+    subscriber = RacedQueue(maxsize=1)
+    subscriber.put_nowait({"from": "earlier"})
+    broker._subscribers["m1"].add(subscriber)
+
+    broker.publish("m1", {"from": "us"})
+
+    assert subscriber.get_nowait() == {"from": "other publisher"}
@@ -0,0 +1,19 @@
+"""Storage failures on the image endpoints come back as JSON errors and are logged."""
+from __future__ import annotations
+
+
+class FailingStorage:
+    def stat(self, name):
+        raise ConnectionError("storage unavailable")
+
+
+def test_get_image_storage_error_is_a_json_500(app_module, client, monkeypatch):
+    logged = []
+    monkeypatch.setattr(app_module, "get_image_storage", FailingStorage)
+    monkeypatch.setattr(app_module.metrics, "log_error", lambda event, error, **fields: logged.append((event, fields)))
+
+    response = client.get("/api/v1/images/some-image")
+
+    assert response.status_code == 500
+    assert response.get_json() == {"message": "Error fetching image"}
+    assert logged == [("image_fetch_failed", {"image_id": "some-image"})]
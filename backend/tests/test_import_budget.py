@@ -0,0 +1,10 @@
+"""Importing app stays within IMPORT_BUDGET_MS and leaves heavy dependencies, threads and Mongo alone."""
+from __future__ import annotations
+
+from benchmarks.import_budget import check
+
+
+def test_import_app_within_budget():
+    median_ms, problems = check(runs=3)
+
+    assert not problems, f"import app: median {median_ms:.0f}ms; " + "; ".join(problems)
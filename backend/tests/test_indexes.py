@@ -0,0 +1,96 @@
+"""Uniqueness holds before the unique indexes exist, readiness waits for them, and the explain check flags scans."""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+
+import mongomock
+import pytest
+
+import db_indexes
+
+
+@pytest.fixture
+def unindexed_users(app_module, monkeypatch):
+    """A users collection with none of the unique indexes, as before the warm-up has built them."""
+    monkeypatch.setattr(app_module, "users_collection", mongomock.MongoClient().db.users)
+    monkeypatch.setattr(app_module, "_unique_indexes_ready", threading.Event())
+    return app_module._unique_indexes_ready
+
+
+def _register(client, username):
+    return client.post("/api/v1/users/register", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+
+
+def test_register_pre_checks_duplicates_until_unique_indexes_are_ready(client, unindexed_users):
+    username = f"dup-{uuid.uuid4().hex[:8]}"
+
+    assert _register(client, username).status_code == 200
+    assert _register(client, username).status_code == 409
+
+
+def test_register_relies_on_the_index_once_ready(client, unindexed_users):
+    unindexed_users.set()
+    username = f"dup-{uuid.uuid4().hex[:8]}"
+
+    assert _register(client, username).status_code == 200
+    # No index in this stand-in, so only the (skipped) pre-check could have caught it
+    assert _register(client, username).status_code == 200
+
+
+def test_join_module_pre_checks_duplicates_until_unique_indexes_are_ready(app_module, client, db, make_user, monkeypatch):
+    monkeypatch.setattr(app_module, "module_participants_collection", mongomock.MongoClient().db.module_participants)
+    monkeypatch.setattr(app_module, "_unique_indexes_ready", threading.Event())
+    module_code = f"JM{uuid.uuid4().hex[:6]}"
+    db.modules.insert_one({"code": module_code})
+    _, headers = make_user()
+
+    assert client.post("/api/v1/join_module", headers=headers, json={"module_code": module_code}).status_code == 201
+    assert client.post("/api/v1/join_module", headers=headers, json={"module_code": module_code}).status_code == 400
+
+
+def test_readiness_fails_while_a_unique_index_is_missing(app_module, client, monkeypatch):
+    def fail(db):
+        raise db_indexes.UniqueIndexError("Unique indexes not built: users.email_unique")
+
+    monkeypatch.setattr(app_module, "ensure_indexes", fail)
+    app_module._reset_warm_up()
+    try:
+        client.get("/healthz")
+        deadline = time.monotonic() + 5
+        while app_module._warm_up_thread is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        response = client.get("/readyz")
+        assert response.status_code == 503
+        assert response.get_json()["checks"]["unique_indexes"] is False
+    finally:
+        app_module._reset_warm_up()
+
+
+class ExplainCursor:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def sort(self, sort):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": self.stage}}}}
+
+
+class ExplainDatabase:
+    def __init__(self, stages):
+        self.stages = stages
+
+    def __getitem__(self, name):
+        return type("Collection", (), {"find": lambda _, query: ExplainCursor(self.stages.get(name, "IXSCAN"))})()
+
+
+def test_find_uncovered_queries_flags_collection_scans_and_in_memory_sorts():
+    assert db_indexes.find_uncovered_queries(ExplainDatabase({})) == []
+
+    problems = db_indexes.find_uncovered_queries(ExplainDatabase({"users": "COLLSCAN", "attendance_stats": "SORT"}))
+    assert problems and all(problem.startswith(("users ", "attendance_stats ")) for problem in problems)
+    assert any("COLLSCAN" in problem for problem in problems) and any("SORT" in problem for problem in problems)
@@ -0,0 +1,19 @@
+"""A module's leaderboard is returned whole unless the caller asks for a page."""
+from __future__ import annotations
+
+import uuid
+
+
+def test_module_board_is_unbounded_without_limit(client, db, make_user):
+    module_code = f"LB{uuid.uuid4().hex[:6]}"
+    module_id = str(db.modules.insert_one({"code": module_code}).inserted_id)
+    for count in range(1, 61):
+        user_id, headers = make_user()
+        db.module_participants.insert_one({"user_id": user_id, "module_id": module_id, "attendance_count": count})
+
+    whole = client.get(f"/api/v1/retrieve_leaderboard?module_code={module_code}", headers=headers).get_json()
+    page = client.get(f"/api/v1/retrieve_leaderboard?module_code={module_code}&limit=3", headers=headers).get_json()
+
+    assert len(whole["leaderboard"]) == 60
+    assert whole["limit"] is None
+    assert [entry["attendance_count"] for entry in page["leaderboard"]] == [60, 59, 58]
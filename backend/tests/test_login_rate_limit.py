@@ -0,0 +1,22 @@
+"""With no trusted proxies, a client can't dodge the per-IP login limit by rotating X-Forwarded-For."""
+from __future__ import annotations
+
+import uuid
+
+from rate_limit import RateLimiter
+
+
+def test_spoofed_forwarded_for_is_ignored_without_trusted_proxies(app_module, client, monkeypatch):
+    assert app_module.TRUSTED_PROXY_HOPS == 0
+    monkeypatch.setattr(app_module, "login_ip_limiter", RateLimiter(2, 60))
+
+    statuses = [
+        client.post(
+            "/api/v1/users/login",
+            json={"username": f"nobody-{uuid.uuid4().hex[:8]}", "password": "wrong"},
+            headers={"X-Forwarded-For": f"203.0.113.{n}"},
+        ).status_code
+        for n in range(3)
+    ]
+
+    assert statuses == [401, 401, 429]
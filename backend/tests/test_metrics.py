@@ -0,0 +1,23 @@
+"""Requests whose handler raises are still timed, labelled 500 and stop counting Mongo commands."""
+from __future__ import annotations
+
+import pytest
+
+import metrics
+
+
+def test_unhandled_exception_is_recorded_as_500(app_module, client, monkeypatch):
+    def explode(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app_module.prediction_service, "at", explode)
+    labels = ("/api/v1/predict", "GET", "500")
+    before = metrics.REQUEST_SECONDS.snapshot().get(labels)
+
+    # With propagation (debug, testing) Flask skips after_request entirely
+    monkeypatch.setitem(app_module.app.config, "PROPAGATE_EXCEPTIONS", True)
+    with pytest.raises(RuntimeError):
+        client.get("/api/v1/predict")
+
+    assert metrics.REQUEST_SECONDS.snapshot().get(labels) != before
+    assert metrics._current.get() is None
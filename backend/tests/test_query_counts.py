@@ -0,0 +1,54 @@
+"""How many Mongo queries the check-in path issues, counted on the mongomock stand-in."""
+from __future__ import annotations
+
+import datetime
+import uuid
+from collections import Counter
+
+import pytest
+
+CLASSMATES = 10
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """Count find/find_one calls per collection for the duration of a test."""
+    import mongomock
+
+    counts = Counter()
+    for method in ("find", "find_one"):
+        original = getattr(mongomock.collection.Collection, method)
+
+        def counted(self, *args, _original=original, _method=method, **kwargs):
+            counts[(self.name, _method)] += 1
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(mongomock.collection.Collection, method, counted)
+    return counts
+
+
+def test_log_attendance_fetches_classmates_in_one_query(client, db, make_user, queries):
+    module_code = f"QC{uuid.uuid4().hex[:6]}"
+    module_id = str(db.modules.insert_one({"code": module_code, "name": "Query counts"}).inserted_id)
+
+    today = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    for n in range(CLASSMATES):
+        classmate_id, _ = make_user("classmate")
+        db.lecture_attendances.insert_one({
+            "user_id": classmate_id, "module_id": module_id, "date": today + datetime.timedelta(seconds=n), "image_id": "x",
+        })
+
+    user_id, headers = make_user()
+    db.module_participants.insert_one({"user_id": user_id, "module_id": module_id})
+    image_id = str(uuid.uuid4())
+    db.images.insert_one({"_id": image_id, "user_id": user_id, "status": "ready"})
+    # Prime the principal cache so only the handler's own lookups are counted
+    assert client.get("/api/v1/modules", headers=headers).status_code == 200
+
+    queries.clear()
+    response = client.post("/api/v1/log_attendance", headers=headers, json={"module_code": module_code, "image_id": image_id})
+
+    assert response.status_code == 201
+    assert len(response.get_json()["classmates"]) == CLASSMATES
+    user_queries = queries[("users", "find")] + queries[("users", "find_one")]
+    assert user_queries == 1, f"expected one batched user lookup for {CLASSMATES} classmates, got {user_queries}"
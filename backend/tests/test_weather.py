@@ -0,0 +1,38 @@
+"""Workers refreshing the forecast at once never share a temp file or publish a torn snapshot."""
+from __future__ import annotations
+
+import datetime
+import itertools
+import json
+import threading
+
+import weather
+
+
+def _hourly(offset):
+    start = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    times = [(start + datetime.timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(48)]
+    return {"time": times, "temperature_2m": [offset] * 48, "precipitation": [0.0] * 48, "cloud_cover": [50] * 48}
+
+
+def test_concurrent_refreshes_leave_one_whole_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "weather_snapshot.json"
+    providers = [weather.WeatherProvider(path) for _ in range(8)]
+    payloads = itertools.count()
+    lock = threading.Lock()
+
+    def fetch():
+        with lock:
+            return _hourly(float(next(payloads)))
+
+    monkeypatch.setattr(weather, "fetch_forecast", fetch)
+    threads = [threading.Thread(target=provider.refresh) for provider in providers for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = json.loads(path.read_text())
+    assert len(set(snapshot["hourly"]["temperature_2m"])) == 1
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+    assert weather.WeatherProvider(path).source == "snapshot"
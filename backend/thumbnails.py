@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import io
+import os
+import threading
+from concurrent.futures import Executor, Future
+from typing import Dict, Optional
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; without it only originals are served
+    Image = None
+
+from concurrency import native_thread_pool
+from image_storage import ImageStorage
+from metrics import log_error
+
+# Longest edge in pixels of each derivative generated for an upload
+THUMBNAIL_SIZES = (96, 384)
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "2"))
+THUMBNAIL_QUALITY = 80
+
+_EXECUTOR: Optional[Executor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def derivative_name(image_id: str, size: int) -> str:
+    return f"{image_id}@{size}"
+
+
+def _output_format() -> tuple[str, str]:
+    if features.check("webp"):
+        return "WEBP", "image/webp"
+    return "JPEG", "image/jpeg"
+
+
+def render_derivatives(data: bytes) -> Dict[int, tuple[bytes, str]]:
+    """Resize `data` to every THUMBNAIL_SIZES edge, returning {size: (bytes, content_type)}.
+
+    The image is rotated per its EXIF orientation and then re-encoded without
+    any metadata, so GPS/camera EXIF never leaves the original upload.
+    """
+    if Image is None:
+        return {}
+
+    fmt, content_type = _output_format()
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+        if fmt == "JPEG" and source.mode == "RGBA":
+            source = source.convert("RGB")
+
+        derivatives = {}
+        for size in THUMBNAIL_SIZES:
+            thumb = source.copy()
+            thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            thumb.save(out, format=fmt, quality=THUMBNAIL_QUALITY, optimize=True)
+            derivatives[size] = (out.getvalue(), content_type)
+    return derivatives
+
+
+def generate_derivatives(storage: ImageStorage, image_id: str, data: Optional[bytes] = None) -> None:
+    try:
+        if data is None:
+            data = storage.read(image_id)
+        for size, (payload, content_type) in render_derivatives(data).items():
+            storage.upload(derivative_name(image_id, size), io.BytesIO(payload), content_type=content_type)
+    except Exception as e:
+        log_error("thumbnail_generation_failed", e, image_id=image_id)
+
+
+def _get_executor() -> Executor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = native_thread_pool(THUMBNAIL_WORKERS, "thumbnails")
+    return _EXECUTOR
+
+
+def schedule_derivatives(storage: ImageStorage, image_id: str, data: Optional[bytes] = None) -> Optional[Future]:
+    """Queue derivative generation off the request thread; a no-op without Pillow.
+
+    Without `data` (a direct-to-bucket upload) the original is read back from storage by the worker.
+    """
+    if Image is None:
+        return None
+    return _get_executor().submit(generate_derivatives, storage, image_id, data)
@@ -0,0 +1,257 @@
+"""Columnar, pre-aggregated hourly store behind predictor.train_model.
+
+`update_store()` reads only the columns training needs, with explicit
+dtypes, from each weekly footfall CSV that hasn't been ingested yet. It
+folds them into per-hour totals and writes every column as its own .npy
+file next to a manifest recording which CSVs (by content hash) are
+included. New weekly files are appended incrementally; a changed or
+removed file, or a new weather.csv, rebuilds the store. Training then
+memory-maps the arrays instead of re-parsing every CSV.
+
+Each update writes a complete new generation (arrays, location stats and
+manifest) into its own directory and then atomically repoints CURRENT at
+it, so a crash mid-update leaves the previous generation intact and a
+retry can't fold the same week in twice.
+
+The same pass folds each week's rows, joined to weather, into the
+per-location sufficient statistics of location_model (locations.npz).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+import location_model
+from atomic_files import atomic_write
+
+STORE_VERSION = 3
+# Generations that aren't CURRENT and are older than this are left over from a crash or a lost race
+STALE_GENERATION_SECONDS = 3600
+FOOTFALL_COLUMNS = {
+    "LocationName": "category", "Date": "category", "Hour": "category", "InCount": "float64", "OutCount": "float64",
+}
+WEATHER_COLUMNS = {
+    "time": "str",
+    "temperature_2m (°C)": "float64",
+    "precipitation (mm)": "float64",
+    "cloud_cover (%)": "float64",
+}
+WEATHER_FIELDS = {"temperature_2m (°C)": "temperature", "precipitation (mm)": "precipitation", "cloud_cover (%)": "cloud_cover"}
+
+
+@dataclass(frozen=True)
+class HourlyData:
+    """Footfall joined to weather, one entry per hour present in both, sorted by hour."""
+
+    hour: np.ndarray  # datetime64[h]
+    in_count: np.ndarray
+    out_count: np.ndarray
+    temperature: np.ndarray
+    precipitation: np.ndarray
+    cloud_cover: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.hour)
+
+
+def _file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def read_footfall_rows(path: Path) -> Dict[str, np.ndarray]:
+    """The per-sensor rows of one weekly CSV with a parsed hour, dropping rows whose date or hour won't parse."""
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=list(FOOTFALL_COLUMNS), dtype=FOOTFALL_COLUMNS)
+    # Each weekly file has a handful of distinct dates and 24 hours, so parse the categories rather than every row
+    dates = pd.to_datetime(df["Date"].cat.categories, format="%d-%b-%y", errors="coerce").to_numpy("datetime64[h]")
+    hours = pd.to_datetime(df["Hour"].cat.categories, format="%H:%M", errors="coerce")
+    offsets = (hours - hours.normalize()).to_numpy().astype("timedelta64[h]")
+
+    date_codes = df["Date"].cat.codes.to_numpy()
+    hour_codes = df["Hour"].cat.codes.to_numpy()
+    valid = (date_codes >= 0) & (hour_codes >= 0)
+    stamps = dates[np.where(valid, date_codes, 0)] + offsets[np.where(valid, hour_codes, 0)]
+    valid &= ~np.isnat(stamps)
+
+    return {
+        "hour": stamps[valid],
+        "location": df["LocationName"].astype(str).to_numpy()[valid],
+        "in_count": df["InCount"].to_numpy()[valid],
+        "out_count": df["OutCount"].to_numpy()[valid],
+    }
+
+
+def hourly_totals(rows: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """InCount/OutCount summed over every sensor for each hour."""
+    unique_hours, inverse = np.unique(rows["hour"], return_inverse=True)
+    totals = {"hour": unique_hours}
+    for field in ("in_count", "out_count"):
+        totals[field] = np.bincount(inverse, weights=np.nan_to_num(rows[field]), minlength=len(unique_hours))
+    return totals
+
+
+def read_footfall_file(path: Path) -> Dict[str, np.ndarray]:
+    return hourly_totals(read_footfall_rows(path))
+
+
+def accumulate_locations(stats: Dict[str, location_model.LocationStats], rows: Dict[str, np.ndarray], weather: Dict[str, np.ndarray]) -> None:
+    """Fold footfall rows into per-location statistics; rows for hours without weather are skipped."""
+    position = np.searchsorted(weather["hour"], rows["hour"])
+    position = np.minimum(position, len(weather["hour"]) - 1)
+    matched = weather["hour"][position] == rows["hour"] if len(weather["hour"]) else np.zeros(len(rows["hour"]), bool)
+    position = position[matched]
+
+    X = location_model.design_matrix(
+        location_model.hour_of_week(rows["hour"][matched]),
+        *(np.asarray(weather[name])[position] for name in location_model.WEATHER_FEATURES),
+    )
+    location_model.accumulate(stats, rows["location"][matched], X, rows["in_count"][matched])
+
+
+def read_weather_file(path: Path) -> Dict[str, np.ndarray]:
+    import pandas as pd
+
+    df = pd.read_csv(path, skiprows=2, usecols=list(WEATHER_COLUMNS), dtype=WEATHER_COLUMNS)
+    weather = {"hour": pd.to_datetime(df["time"], format="%Y-%m-%dT%H:%M").to_numpy("datetime64[h]")}
+    for column, field in WEATHER_FIELDS.items():
+        weather[field] = df[column].to_numpy()
+    order = np.argsort(weather["hour"], kind="stable")
+    return {field: values[order] for field, values in weather.items()}
+
+
+def _merge_footfall(existing: Optional[Dict[str, np.ndarray]], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    if existing is None or not len(existing["hour"]):
+        return new
+    hours = np.concatenate([existing["hour"], new["hour"]])
+    unique_hours, inverse = np.unique(hours, return_inverse=True)
+    merged = {"hour": unique_hours}
+    for field in ("in_count", "out_count"):
+        merged[field] = np.bincount(inverse, weights=np.concatenate([existing[field], new[field]]), minlength=len(unique_hours))
+    return merged
+
+
+def _save_arrays(generation_dir: Path, prefix: str, arrays: Dict[str, np.ndarray]) -> None:
+    for field, values in arrays.items():
+        np.save(generation_dir / f"{prefix}.{field}.npy", values)
+
+
+def _load_arrays(generation_dir: Path, prefix: str, fields: Iterable[str]) -> Dict[str, np.ndarray]:
+    return {field: np.load(generation_dir / f"{prefix}.{field}.npy", mmap_mode="r") for field in fields}
+
+
+def _current_generation(store_dir: Path) -> Optional[Path]:
+    try:
+        name = (store_dir / "CURRENT").read_text().strip()
+    except OSError:
+        return None
+    return store_dir / name if name else None
+
+
+def _read_manifest(generation_dir: Optional[Path]) -> Dict:
+    if generation_dir is None:
+        return {}
+    try:
+        manifest = json.loads((generation_dir / "manifest.json").read_text())
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get("version") == STORE_VERSION else {}
+
+
+def _remove_old_generations(store_dir: Path, previous: Optional[Path], current: Path) -> None:
+    # Another process may still be building its own generation, so only recent ones other than the one we replaced survive
+    cutoff = time.time() - STALE_GENERATION_SECONDS
+    for generation_dir in store_dir.glob("gen-*"):
+        if generation_dir == current:
+            continue
+        if generation_dir == previous or generation_dir.stat().st_mtime < cutoff:
+            shutil.rmtree(generation_dir, ignore_errors=True)
+
+
+def update_store(store_dir: Path, footfall_files: Iterable[Path], weather_file: Path) -> Dict:
+    """Bring the store up to date with the given CSVs, reading only what changed; returns the manifest."""
+    store_dir.mkdir(parents=True, exist_ok=True)
+    previous = _current_generation(store_dir)
+    manifest = _read_manifest(previous)
+    ingested: Dict[str, str] = dict(manifest.get("footfall_files", {}))
+
+    current = {path.name: path for path in footfall_files}
+    hashes = {name: _file_hash(path) for name, path in current.items()}
+    weather_hash = _file_hash(weather_file)
+    # Sums can't be un-summed, so an edited or deleted week (or new weather for the location stats) means starting over
+    rebuild = not manifest or manifest.get("weather_file") != weather_hash or any(
+        name not in hashes or hashes[name] != digest for name, digest in ingested.items()
+    )
+    pending = [name for name in sorted(current) if rebuild or name not in ingested]
+    if not pending and not rebuild:
+        return manifest
+
+    if rebuild:
+        ingested = {}
+        weather = read_weather_file(weather_file)
+        footfall = None
+        locations: Dict[str, location_model.LocationStats] = {}
+    else:
+        weather = {k: np.asarray(v) for k, v in _load_arrays(previous, "weather", ("hour", *WEATHER_FIELDS.values())).items()}
+        footfall = {k: np.asarray(v) for k, v in _load_arrays(previous, "footfall", ("hour", "in_count", "out_count")).items()}
+        locations = location_model.load_stats(previous / "locations.npz")
+
+    for name in pending:
+        rows = read_footfall_rows(current[name])
+        footfall = _merge_footfall(footfall, hourly_totals(rows))
+        accumulate_locations(locations, rows, weather)
+        ingested[name] = hashes[name]
+    if footfall is None:
+        footfall = {"hour": np.array([], dtype="datetime64[h]"), "in_count": np.array([]), "out_count": np.array([])}
+
+    manifest = {"version": STORE_VERSION, "footfall_files": ingested, "weather_file": weather_hash}
+    generation_dir = Path(tempfile.mkdtemp(dir=store_dir, prefix="gen-"))
+    try:
+        _save_arrays(generation_dir, "weather", weather)
+        _save_arrays(generation_dir, "footfall", footfall)
+        location_model.save_stats(generation_dir / "locations.npz", locations)
+        (generation_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+        # The generation only becomes visible once it is complete
+        with atomic_write(store_dir / "CURRENT", "w") as file:
+            file.write(generation_dir.name)
+    except BaseException:
+        shutil.rmtree(generation_dir, ignore_errors=True)
+        raise
+    _remove_old_generations(store_dir, previous, generation_dir)
+    return manifest
+
+
+def _require_generation(store_dir: Path) -> Path:
+    generation_dir = _current_generation(store_dir)
+    if generation_dir is None:
+        raise FileNotFoundError(f"No training store in {store_dir}; run update_store first")
+    return generation_dir
+
+
+def load_location_stats(store_dir: Path) -> Dict[str, location_model.LocationStats]:
+    return location_model.load_stats(_require_generation(store_dir) / "locations.npz")
+
+
+def load_hourly(store_dir: Path) -> HourlyData:
+    """Join the stored footfall and weather hours (inner join, like the old DataFrame merge)."""
+    generation_dir = _require_generation(store_dir)
+    footfall = _load_arrays(generation_dir, "footfall", ("hour", "in_count", "out_count"))
+    weather = _load_arrays(generation_dir, "weather", ("hour", *WEATHER_FIELDS.values()))
+
+    hours, footfall_index, weather_index = np.intersect1d(footfall["hour"], weather["hour"], assume_unique=True, return_indices=True)
+    return HourlyData(
+        hour=hours,
+        in_count=np.asarray(footfall["in_count"])[footfall_index],
+        out_count=np.asarray(footfall["out_count"])[footfall_index],
+        temperature=np.asarray(weather["temperature"])[weather_index],
+        precipitation=np.asarray(weather["precipitation"])[weather_index],
+        cloud_cover=np.asarray(weather["cloud_cover"])[weather_index],
+    )
@@ -22,7 +22,7 @@ def test_jwt_flow():
     print("Registration successful (or user existed).")
 
     # 2. Login
-    print(f"Logging in...")
+    print("Logging in...")
     resp = requests.post(f"{BASE_URL}/users/login", json={
         "username": username,
         "password": password
@@ -38,7 +38,7 @@ def test_jwt_flow():
         sys.exit(1)
     
     token = data["token"]
-    print(f"Login successful. Token received.")
+    print("Login successful. Token received.")
 
     # 3. Access protected route WITHOUT token
     print("Accessing protected route WITHOUT token...")
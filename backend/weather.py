@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+import requests
+
+from atomic_files import atomic_write
+from metrics import log_error, timed
+
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+FORECAST_LATITUDE = 53.8008
+FORECAST_LONGITUDE = -0.15491
+FORECAST_REFRESH_SECONDS = int(os.environ.get("FORECAST_REFRESH_SECONDS", 60 * 60))
+FORECAST_RETRY_SECONDS = int(os.environ.get("FORECAST_RETRY_SECONDS", 5 * 60))
+FORECAST_REQUEST_TIMEOUT_SECONDS = 10
+FALLBACK_HORIZON_HOURS = 7 * 24
+
+
+def _backend_dir() -> Path:
+    return Path(__file__).resolve().parent
+
+
+def _snapshot_path() -> Path:
+    return Path(os.environ.get("WEATHER_SNAPSHOT_PATH", _backend_dir() / "artifacts" / "weather_snapshot.json"))
+
+
+def _utc_hour(now: Optional[datetime.datetime] = None) -> pd.Timestamp:
+    now = now or datetime.datetime.utcnow()
+    return pd.Timestamp(now).floor("h")
+
+
+def frame_from_hourly(hourly: Dict[str, Any]) -> pd.DataFrame:
+    """Turn Open-Meteo's `hourly` payload into the datetime-indexed frame the API reads."""
+    return pd.DataFrame({
+        "datetime": pd.to_datetime(hourly["time"]),  # Open-Meteo returns ISO strings
+        "temperature": hourly["temperature_2m"],
+        "precipitation": hourly["precipitation"],
+        "cloud_cover": hourly["cloud_cover"],
+    }).set_index("datetime").sort_index()
+
+
+@timed("open_meteo", "forecast")
+def fetch_forecast() -> Dict[str, Any]:
+    response = requests.get(OPEN_METEO_URL, {
+        "latitude": FORECAST_LATITUDE,
+        "longitude": FORECAST_LONGITUDE,
+        "hourly": ",".join([
+            "temperature_2m",
+            "precipitation",
+            "cloud_cover"
+        ])
+    }, timeout=FORECAST_REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()["hourly"]
+
+
+def fallback_frame(now: Optional[datetime.datetime] = None) -> pd.DataFrame:
+    """Project the bundled historical weather onto the week ahead.
+
+    Each upcoming hour gets the mean conditions recorded for the same
+    weekday and hour in datasets/weather/weather.csv, which beats having
+    no forecast at all when Open-Meteo is unreachable.
+    """
+    history = pd.read_csv(_backend_dir() / "datasets" / "weather" / "weather.csv", skiprows=2)
+    history["datetime"] = pd.to_datetime(history["time"])
+    history = history.rename(columns={
+        "temperature_2m (°C)": "temperature",
+        "precipitation (mm)": "precipitation",
+        "cloud_cover (%)": "cloud_cover",
+    })
+    profile = history.groupby(
+        [history["datetime"].dt.dayofweek, history["datetime"].dt.hour]
+    )[["temperature", "precipitation", "cloud_cover"]].mean()
+
+    index = pd.date_range(_utc_hour(now), periods=FALLBACK_HORIZON_HOURS, freq="h", name="datetime")
+    keys = pd.MultiIndex.from_arrays([index.dayofweek, index.hour])
+    return pd.DataFrame(profile.reindex(keys).to_numpy(), index=index, columns=profile.columns)
+
+
+class WeatherProvider:
+    """Hourly forecast cache refreshed from Open-Meteo on a background thread.
+
+    On construction it loads the last on-disk snapshot (or the bundled
+    fallback) without touching the network; `start()` then keeps it fresh.
+    """
+
+    def __init__(self, snapshot_path: Optional[Path] = None):
+        self.snapshot_path = snapshot_path or _snapshot_path()
+        self.source = "fallback"
+        self.fetched_at: Optional[datetime.datetime] = None
+        self._frame = self._load_cold_start()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_cold_start(self) -> pd.DataFrame:
+        try:
+            if self.snapshot_path.is_file():
+                snapshot = json.loads(self.snapshot_path.read_text())
+                frame = frame_from_hourly(snapshot["hourly"])
+                # A snapshot whose horizon has already passed is worse than the fallback profile
+                if len(frame) and frame.index[-1] >= _utc_hour():
+                    self.source = "snapshot"
+                    self.fetched_at = datetime.datetime.fromisoformat(snapshot["fetched_at"])
+                    return frame
+        except (OSError, ValueError, KeyError) as e:
+            log_error("weather_snapshot_ignored", e)
+        return fallback_frame()
+
+    def refresh(self) -> bool:
+        """Fetch a new forecast, returning False (and keeping the old data) on failure."""
+        try:
+            hourly = fetch_forecast()
+            frame = frame_from_hourly(hourly)
+        except Exception as e:
+            log_error("weather_refresh_failed", e)
+            return False
+
+        fetched_at = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            self._frame = frame
+            self.source = "open-meteo"
+            self.fetched_at = fetched_at
+
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            # Every worker refreshes on its own, so each writes through its own temp file
+            with atomic_write(self.snapshot_path, "w") as file:
+                file.write(json.dumps({"fetched_at": fetched_at.isoformat(), "hourly": hourly}))
+        except OSError as e:
+            log_error("weather_snapshot_write_failed", e)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            delay = FORECAST_REFRESH_SECONDS if self.refresh() else FORECAST_RETRY_SECONDS
+            self._stop.wait(delay)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="weather-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            return self._frame
@@ -1,7 +1,8 @@
 import { useState, useEffect, useRef } from 'react';
 import { Camera, X, Check, Users } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
-import { uploadImage, logAttendance, getModules } from '../services/api';
+import { jwtDecode } from "jwt-decode";
+import { uploadImage, logAttendance, getModules, subscribeToCheckins } from '../services/api';
 
 const Attendance = () => {
     const [showCamera, setShowCamera] = useState(false);
@@ -35,6 +36,21 @@ const Attendance = () => {
         { id: 5, name: "James R.", avatar: "https://i.pravatar.cc/150?u=james", time: "10:04 AM" },
     ]);
 
+    // After checking in, keep the classmates list live instead of re-polling
+    useEffect(() => {
+        if (!isCheckedIn || !selectedModule) return;
+        const myId = jwtDecode(localStorage.getItem('token')).sub;
+        return subscribeToCheckins(selectedModule, (checkin) => {
+            if (checkin.id === myId) return;
+            setClassmates((current) => {
+                if (current.some((c) => c.event_id === checkin.event_id)) return current;
+                // Newest first, just below the "You" entry
+                const [me, ...others] = current;
+                return [me, checkin, ...others];
+            });
+        });
+    }, [isCheckedIn, selectedModule]);
+
     const [isUploading, setIsUploading] = useState(false);
     const [error, setError] = useState('');
     const videoRef = useRef(null);
@@ -207,7 +223,7 @@ const Attendance = () => {
                                 >
                                     <div className="relative">
                                         {student.image_id ? (
-                                            <img src={`http://127.0.0.1:5000/api/v1/images/${student.image_id}`} alt={student.name} className="w-14 h-14 rounded-full border-2 border-white shadow-sm object-cover" />
+                                            <img src={`http://127.0.0.1:5000/api/v1/images/${student.image_id}?size=96`} alt={student.name} className="w-14 h-14 rounded-full border-2 border-white shadow-sm object-cover" />
                                         ) : (
                                             <div className="w-14 h-14 rounded-full border-2 border-white shadow-sm bg-gray-200 flex items-center justify-center text-gray-400">?</div>
                                         )}
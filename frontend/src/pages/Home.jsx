@@ -30,7 +30,7 @@ const Home = () => {
         const fetchData = async () => {
             try {
                 const [leadersData, historyData, forecastData] = await Promise.all([
-                    getLeaderboard(),
+                    getLeaderboard({ limit: 3 }),
                     getAttendanceHistory(),
                     fetch('http://localhost:5000/api/v1/predict').then(r => r.json())
                 ]);
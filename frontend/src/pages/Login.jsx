@@ -18,6 +18,7 @@ const Login = () => {
         try {
             const data = await login(email, password);
             localStorage.setItem('token', data.token);
+            localStorage.setItem('refresh_token', data.refresh_token);
             navigate('/');
         } catch (err) {
             setError(err.response?.data?.message || 'Failed to login');
@@ -7,6 +7,7 @@ const Settings = () => {
 
     const handleLogout = () => {
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         navigate('/login');
     };
     return (
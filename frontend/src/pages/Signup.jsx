@@ -19,6 +19,7 @@ const Signup = () => {
         try {
             const data = await register(username, email, password);
             localStorage.setItem('token', data.token);
+            localStorage.setItem('refresh_token', data.refresh_token);
             navigate('/');
         } catch (err) {
             setError(err.response?.data?.message || 'Failed to sign up');
@@ -21,6 +21,29 @@ api.interceptors.request.use(
     (error) => Promise.reject(error)
 );
 
+// Swap an expired access token for a new one once, then replay the request
+api.interceptors.response.use(
+    (response) => response,
+    async (error) => {
+        const original = error.config;
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (error.response?.status !== 401 || !refreshToken || original._retried || original.url.startsWith('/users/')) {
+            return Promise.reject(error);
+        }
+        original._retried = true;
+        try {
+            const { data } = await api.post('/users/refresh', { refresh_token: refreshToken });
+            localStorage.setItem('token', data.token);
+            localStorage.setItem('refresh_token', data.refresh_token);
+        } catch (refreshError) {
+            localStorage.removeItem('token');
+            localStorage.removeItem('refresh_token');
+            return Promise.reject(refreshError);
+        }
+        return api(original);
+    }
+);
+
 export const login = async (email, password) => {
     const response = await api.post('/users/login', { email, password });
     return response.data;
@@ -31,13 +54,14 @@ export const register = async (username, email, password) => {
     return response.data;
 };
 
-export const getLeaderboard = async () => {
-    const response = await api.get('/retrieve_leaderboard');
+export const getLeaderboard = async (params = {}) => {
+    const response = await api.get('/retrieve_leaderboard', { params });
     return response.data;
 };
 
-export const getAttendanceHistory = async () => {
-    const response = await api.get('/attendance_history');
+// params: { from, to, cursor, limit, group: 'day' }; pass next_cursor back as cursor for the next page
+export const getAttendanceHistory = async (params = {}) => {
+    const response = await api.get('/attendance_history', { params });
     return response.data;
 };
 
@@ -46,14 +70,18 @@ export const logAttendance = async (module_code, image_id) => {
     return response.data;
 };
 
+// items: [{ idempotency_key, module_code, image_id, logged_at }] queued while offline
+export const logAttendanceBatch = async (items) => {
+    const response = await api.post('/log_attendance/batch', { items });
+    return response.data;
+};
+
+// The photo goes straight to storage through a short-lived signed URL, then the API verifies and records it
 export const uploadImage = async (file) => {
-    const formData = new FormData();
-    formData.append('file', file);
-    const response = await api.post('/images/upload', formData, {
-        headers: {
-            'Content-Type': 'multipart/form-data',
-        },
-    });
+    const { data: upload } = await api.post('/images/upload_url', { content_type: file.type || 'image/jpeg' });
+    // Plain axios: the signed URL is the credential, and storage rejects an extra Authorization header
+    await axios({ method: upload.method, url: upload.upload_url, data: file, headers: upload.headers });
+    const response = await api.post(`/images/${upload.uuid}/complete`);
     return response.data;
 };
 
@@ -67,6 +95,20 @@ export const getModules = async () => {
     return response.data;
 };
 
+export const getForecastRange = async (from, to) => {
+    const response = await api.get('/predict/range', { params: { from, to } });
+    return response.data;
+};
+
+// Live check-ins for a module; returns a function that closes the stream
+export const subscribeToCheckins = (module_code, onCheckin) => {
+    const token = localStorage.getItem('token');
+    const url = `${API_URL}/modules/${encodeURIComponent(module_code)}/checkins/stream?access_token=${encodeURIComponent(token)}`;
+    const source = new EventSource(url);
+    source.addEventListener('checkin', (event) => onCheckin(JSON.parse(event.data)));
+    return () => source.close();
+};
+
 export const getAttendanceCount = async () => {
     const response = await api.get('/count_attendance');
     return response.data;